@@ -0,0 +1,185 @@
+"""Benchmarks for the I/O and transform functions.
+
+Run them with:
+
+    python -m dobishem.benchmarks --sizes 10000 100000 --output results.json
+
+and compare with an earlier run by adding --baseline earlier.json.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import dobishem.dates
+import dobishem.storage
+from dobishem.nested_messages import BeginAndEndMessages
+
+ACCOUNTS = ["Current", "Savings", "Credit card", "Cash"]
+CATEGORIES = ["Food", "Travel", "Rent", "Books", "Clothes", "Utilities", "Eating out"]
+ITEMS = ["akullore", "buke", "spinaq", "kos", "djathe", "qumesht", "bileta", "qira"]
+
+def ledger_rows(count, seed=0, start=datetime.date(2000, 1, 1)):
+    """Yield count synthetic ledger rows, in date order."""
+    rng = random.Random(seed)
+    per_day = max(1, count // 3650)
+    for i in range(count):
+        yield {'Date': (start + datetime.timedelta(days=i // per_day)).isoformat(),
+               'Account': rng.choice(ACCOUNTS),
+               'Category': rng.choice(CATEGORIES),
+               'Item': rng.choice(ITEMS),
+               'Amount': "%.2f" % rng.uniform(-500, 500)}
+
+def _file_bytes(filename):
+    return os.path.getsize(filename) if os.path.exists(filename) else 0
+
+def bench_write_csv(directory, rows):
+    filename = os.path.join(directory, "ledger.csv")
+    return lambda: dobishem.storage.default_write_csv(filename, rows), filename
+
+def bench_read_csv(directory, rows):
+    filename = os.path.join(directory, "ledger.csv")
+    dobishem.storage.default_write_csv(filename, rows)
+    return lambda: dobishem.storage.default_read_csv(filename), filename
+
+def bench_write_orgtable(directory, rows):
+    filename = os.path.join(directory, "ledger.table")
+    return lambda: dobishem.storage.write_orgtable(filename, rows), filename
+
+def bench_read_orgtable(directory, rows):
+    filename = os.path.join(directory, "ledger.table")
+    dobishem.storage.write_orgtable(filename, rows)
+    return lambda: dobishem.storage.read_orgtable(filename), filename
+
+def bench_save_json(directory, rows):
+    filename = os.path.join(directory, "ledger.json")
+    return lambda: dobishem.storage.save(filename, rows), filename
+
+def bench_load_json(directory, rows):
+    filename = os.path.join(directory, "ledger.json")
+    dobishem.storage.save(filename, rows)
+    return lambda: dobishem.storage.load(filename), filename
+
+def bench_save_yaml(directory, rows):
+    filename = os.path.join(directory, "ledger.yaml")
+    return lambda: dobishem.storage.save(filename, rows), filename
+
+def bench_load_yaml(directory, rows):
+    filename = os.path.join(directory, "ledger.yaml")
+    dobishem.storage.save(filename, rows)
+    return lambda: dobishem.storage.load(filename), filename
+
+def bench_combined(directory, rows):
+    months = 12
+    origins = {}
+    for month in range(months):
+        filename = os.path.join(directory, "month-%02d.csv" % month)
+        dobishem.storage.default_write_csv(filename, rows[month::months])
+        origins[filename] = lambda row: row
+    destination = os.path.join(directory, "combined.csv")
+    def run():
+        if os.path.exists(destination):
+            os.remove(destination)
+        return dobishem.storage.combined(destination,
+                                         lambda lists: [row for rows in lists for row in rows],
+                                         origins)
+    return run, destination
+
+def bench_entries_between_dates(directory, rows):
+    middle = rows[len(rows) // 2]['Date']
+    return (lambda: dobishem.dates.entries_between_dates(rows, rows[0]['Date'], middle),
+            None)
+
+BENCHMARKS = {
+    'write_csv': bench_write_csv,
+    'read_csv': bench_read_csv,
+    'write_orgtable': bench_write_orgtable,
+    'read_orgtable': bench_read_orgtable,
+    'save_json': bench_save_json,
+    'load_json': bench_load_json,
+    'save_yaml': bench_save_yaml,
+    'load_yaml': bench_load_yaml,
+    'combined': bench_combined,
+    'entries_between_dates': bench_entries_between_dates,
+}
+
+def run_benchmark(name, size, directory, measure_memory=True):
+    """Run one benchmark on size rows, returning a dict of its results."""
+    rows = list(ledger_rows(size))
+    function, filename = BENCHMARKS[name](directory, rows)
+    started = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - started
+    result = {'benchmark': name,
+              'rows': size,
+              'seconds': seconds,
+              'rows_per_second': size / seconds if seconds else None}
+    if filename:
+        megabytes = _file_bytes(filename) / 1e6
+        result['megabytes'] = megabytes
+        result['megabytes_per_second'] = megabytes / seconds if seconds else None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            function()
+            result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+def run_benchmarks(sizes, names=None, directory=None, measure_memory=True, verbose=False):
+    """Run the named benchmarks (or all of them) on each size,
+    returning a list of their results."""
+    results = []
+    with tempfile.TemporaryDirectory(dir=directory) as workdir:
+        for size in sizes:
+            for name in names or BENCHMARKS:
+                with BeginAndEndMessages("%s on %d rows" % (name, size), verbose=verbose):
+                    results.append(run_benchmark(name, size, workdir, measure_memory))
+    return results
+
+def compare(results, baseline):
+    """Return a dict of the ratio of each result's time to its baseline time,
+    keyed by (benchmark, rows)."""
+    base_times = {(result['benchmark'], result['rows']): result['seconds']
+                  for result in baseline}
+    return {(result['benchmark'], result['rows']):
+            result['seconds'] / base_times[(result['benchmark'], result['rows'])]
+            for result in results
+            if base_times.get((result['benchmark'], result['rows']))}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument("--benchmarks", nargs='+', choices=sorted(BENCHMARKS))
+    parser.add_argument("--output", help="File to write the results to, as JSON.")
+    parser.add_argument("--baseline", help="Earlier results file to compare with.")
+    parser.add_argument("--directory", help="Where to make the temporary files.")
+    parser.add_argument("--no-memory", action='store_true',
+                        help="Do not measure peak memory, which needs a second run.")
+    args = parser.parse_args()
+    results = run_benchmarks(args.sizes, args.benchmarks, args.directory,
+                             measure_memory=not args.no_memory, verbose=True)
+    for result in results:
+        print("%-22s %10d rows %10.3f s %12.0f rows/s %10s MB/s %12s peak bytes"
+              % (result['benchmark'], result['rows'], result['seconds'],
+                 result['rows_per_second'] or 0,
+                 ("%.2f" % result['megabytes_per_second']
+                  if result.get('megabytes_per_second') is not None
+                  else "-"),
+                 result.get('peak_memory_bytes', "-")))
+    if args.baseline:
+        with open(args.baseline) as instream:
+            for (name, size), ratio in compare(results, json.load(instream)).items():
+                print("%-22s %10d rows %6.2fx baseline time" % (name, size, ratio))
+    if args.output:
+        with open(args.output, 'w') as outstream:
+            json.dump(results, outstream, indent=2)
+
+if __name__ == "__main__":
+    main()
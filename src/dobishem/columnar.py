@@ -0,0 +1,122 @@
+"""Tables stored as columns rather than as rows.
+
+Each column is held as a NumPy array if NumPy is available, or
+otherwise as an array.array for numeric columns and a list for others.
+"""
+
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The types that NumPy can hold compactly without changing the values.
+NUMPY_TYPES = (bool, int, float, str)
+
+def _make_column(values):
+    """Return a compact column holding the given values."""
+    if numpy is not None:
+        kinds = set(map(type, values))
+        if len(kinds) == 1 and kinds.pop() in NUMPY_TYPES:
+            try:
+                return numpy.asarray(values)
+            except OverflowError:
+                pass
+        # Mixed columns, such as numbers with "" for missing cells,
+        # would otherwise all be converted to one type.
+        column = numpy.empty(len(values), dtype=object)
+        column[:] = values
+        return column
+    if values and all(type(value) is int for value in values):
+        return array.array('q', values)
+    if values and all(type(value) is float for value in values):
+        return array.array('d', values)
+    return values
+
+def _as_list(column):
+    """Return the values of a column as a list of Python values."""
+    return column.tolist() if hasattr(column, 'tolist') else list(column)
+
+class ColumnTable:
+
+    """A table of named columns, each of the same length."""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, rows, column_order=None, missing=""):
+        """Make a table from an iterable of dicts.
+        Cells missing from a row are filled in with the missing value."""
+        values = {name: [] for name in (column_order or [])}
+        count = 0
+        for row in rows:
+            for name, value in row.items():
+                if name not in values:
+                    values[name] = [missing] * count
+                values[name].append(value)
+            count += 1
+            for column in values.values():
+                if len(column) < count:
+                    column.append(missing)
+        return cls({name: _make_column(column)
+                    for name, column in values.items()})
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __iter__(self):
+        """Iterate over the table as dict rows."""
+        names = list(self.columns.keys())
+        for values in zip(*(_as_list(column) for column in self.columns.values())):
+            yield dict(zip(names, values))
+
+    def column_names(self):
+        """Return the names of the columns."""
+        return list(self.columns.keys())
+
+    def rows(self):
+        """Return the table as a list of dict rows."""
+        return list(self)
+
+    def mask(self, column, value):
+        """Return a selection mask of the rows with a given value in a given column.
+        If no column is given, all the rows are selected."""
+        if column is None:
+            return ([True] * len(self)
+                    if numpy is None
+                    else numpy.ones(len(self), dtype=bool))
+        if column not in self.columns:
+            return ([False] * len(self)
+                    if numpy is None
+                    else numpy.zeros(len(self), dtype=bool))
+        cells = self.columns[column]
+        return (cells == value
+                if numpy is not None
+                else [cell == value for cell in cells])
+
+    def select(self, mask):
+        """Return a table of the rows for which the mask is true."""
+        if numpy is not None:
+            mask = numpy.asarray(mask, dtype=bool)
+            return ColumnTable({name: column[mask]
+                                for name, column in self.columns.items()})
+        return ColumnTable({name: _make_column([cell
+                                                for cell, keep in zip(column, mask)
+                                                if keep])
+                            for name, column in self.columns.items()})
+
+    def matches(self, match_key, match_value):
+        """Return a table of the rows containing a given value in a given column,
+        as for dobishem.data.matches."""
+        return self.select(self.mask(match_key, match_value))
+
+    def rename_columns(self, column_renames):
+        """Return a table with columns renamed, as for dobishem.data.rename_columns.
+        The columns themselves are shared with this table."""
+        return ColumnTable({column_renames.get(name, name): column
+                            for name, column in self.columns.items()})
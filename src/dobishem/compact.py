@@ -0,0 +1,110 @@
+"""Compact rows, sharing one header among many rows, with interned values.
+
+A CompactRow is a tuple of cell values, so it is small and hashable,
+and iterates over its values as a tuple does, but it can also be read
+like a dict, by column name, through indexing, get, keys and items.
+"""
+
+import functools
+
+# How many distinct values are interned for each column; beyond that,
+# values are stored as they are, so columns of mostly unique values do
+# not make the interning tables grow without bound.
+MAX_INTERNED = 65536
+
+class CompactRow(tuple):
+
+    """A row of cells, readable by column name as well as by position.
+
+    Use row_class to get the subclass for a particular header."""
+
+    __slots__ = ()
+    names = ()
+    index = {}
+    interned = ()
+
+    @classmethod
+    def make(cls, values):
+        """Make a row from a sequence of values in header order,
+        sharing equal values with the rows already made.
+
+        As with csv.DictReader, missing values are None, and any values
+        beyond the header are kept together under the None key."""
+        values = tuple(values)
+        width = len(cls.names)
+        if len(values) > width:
+            return row_class(cls.names + (None,)).make(values[:width]
+                                                       + (values[width:],))
+        if len(values) < width:
+            values += (None,) * (width - len(values))
+        return tuple.__new__(cls, (_interned(table, value)
+                                   for table, value in zip(cls.interned, values)))
+
+    @classmethod
+    def from_dict(cls, row):
+        """Make a row from a dict, with None for any missing columns."""
+        return cls.make([row.get(name) for name in cls.names])
+
+    def __getitem__(self, key):
+        return tuple.__getitem__(self,
+                                 key if isinstance(key, (int, slice)) else self.index[key])
+
+    def get(self, key, default=None):
+        position = self.index.get(key)
+        return default if position is None else tuple.__getitem__(self, position)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        return self.index.keys()
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return zip(self.names, self)
+
+    def to_dict(self):
+        """Return the row as an ordinary dict."""
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = tuple.__hash__
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.to_dict())
+
+    def __reduce__(self):
+        return _rebuild_row, (self.names, self.values())
+
+def _interned(table, value):
+    """Return the shared copy of a value, recording it if there is room."""
+    if (shared := table.get(value)) is not None:
+        return shared
+    if len(table) < MAX_INTERNED:
+        table[value] = value
+    return value
+
+@functools.lru_cache(maxsize=None)
+def row_class(names):
+    """Return the CompactRow subclass for a header, given as a tuple of column names.
+    The same class, and so the same interning tables, is returned for
+    the same header each time."""
+    names = tuple(names)
+    return type("CompactRow", (CompactRow,),
+                {'__slots__': (),
+                 'names': names,
+                 'index': {name: position for position, name in enumerate(names)},
+                 'interned': tuple({} for _ in names)})
+
+def _rebuild_row(names, values):
+    """Unpickle a CompactRow, sharing its values with the rows already here."""
+    return row_class(names).make(values)
@@ -1,6 +1,9 @@
 """Some generic data operations, mostly for data used with csv.DictReader and csv.DictWriter.."""
 
+import abc
 import datetime
+import functools
+import itertools
 
 def rename_columns(raw, column_renames):
     """Returns a row dictionary or a header list with columns renamed."""
@@ -10,7 +13,7 @@ def rename_columns(raw, column_renames):
 
 def transform_cells(row, transformations):
     """Returns a row dict with column-specific transformations applied."""
-    return {k: transformations.get(k, lambda a: a)(v)
+    return {k: (transformations[k](v) if k in transformations else v)
             for k, v in row.items()}
 
 def matches(row, match_key, match_value):
@@ -18,3 +21,335 @@ def matches(row, match_key, match_value):
     If no column is given, returns True."""
     return (match_key is None
             or row.get(match_key) == match_value)
+
+def _chained(functions):
+    """Return a function applying each of the functions in turn, or None if there are none."""
+    if not functions:
+        return None
+    if len(functions) == 1:
+        return functions[0]
+    return lambda value: functools.reduce(lambda result, function: function(result),
+                                          functions, value)
+
+def _rejecting(row):
+    return None
+
+class RowPipeline:
+
+    """A sequence of row operations, compiled into a single function on rows.
+
+    The steps are added by the methods that return the pipeline, so
+    they can be chained:
+
+        RowPipeline().rename({'Amount': 'Price'}).filter('Item', "buke")
+
+    and the pipeline is then called on each row, for example as the
+    transform_row argument of storage.read_csv or as a converter for
+    storage.combined.  It returns a new row, or None for rows that are
+    filtered out, making one dict per row that is kept.
+
+    Renames, cell transforms and matches filters apply to the columns
+    of the incoming rows in the order they are added.  Derived columns
+    and predicate filters are applied after those, in the order they
+    were added, to the row being returned.
+
+    If the header is not given, the pipeline is compiled for the
+    columns of each distinct set of columns it sees."""
+
+    def __init__(self, header=None):
+        self.steps = []
+        self.compiled = {}
+        self.header = header and tuple(header)
+
+    def _add(self, kind, argument):
+        self.steps.append((kind, argument))
+        self.compiled.clear()
+        return self
+
+    def rename(self, column_renames):
+        """Rename columns, as for rename_columns."""
+        return self._add('rename', column_renames)
+
+    def transform(self, transformations):
+        """Apply column-specific transformations, as for transform_cells."""
+        return self._add('transform', transformations)
+
+    def filter(self, match_key, match_value):
+        """Keep only the rows with a given value in a given column, as for matches."""
+        return self._add('filter', (match_key, match_value))
+
+    def where(self, predicate):
+        """Keep only the rows for which a predicate on the result row is true."""
+        return self._add('where', predicate)
+
+    def derive(self, name, function):
+        """Add a column, calculated by a function of the result row."""
+        return self._add('derive', (name, function))
+
+    def compile(self, header=None):
+        """Return the single function on rows for a header."""
+        header = tuple(header or self.header)
+        if header in self.compiled:
+            return self.compiled[header]
+        columns = {name: (name, []) for name in header}
+        checks = []
+        late = []
+        derived = set()
+        for kind, argument in self.steps:
+            if kind == 'rename':
+                columns = {argument.get(name, name): source
+                           for name, source in columns.items()}
+            elif kind == 'transform':
+                columns = {name: (source, functions + [argument[name]]
+                                  if name in argument
+                                  else functions)
+                           for name, (source, functions) in columns.items()}
+            elif kind == 'filter':
+                match_key, match_value = argument
+                if match_key is None:
+                    continue
+                if match_key in columns:
+                    source, functions = columns[match_key]
+                    checks.append((source, _chained(functions), match_value))
+                elif match_key in derived:
+                    late.append(functools.partial(matches,
+                                                  match_key=match_key,
+                                                  match_value=match_value))
+                elif match_value is not None:
+                    self.compiled[header] = _rejecting
+                    return _rejecting
+            elif kind == 'where':
+                late.append(argument)
+            elif kind == 'derive':
+                derived.add(argument[0])
+                late.append(argument)
+        cells = [(name, source, _chained(functions))
+                 for name, (source, functions) in columns.items()]
+
+        def run(row):
+            for source, function, match_value in checks:
+                cell = row.get(source)
+                if (function(cell) if function else cell) != match_value:
+                    return None
+            result = {name: (function(row.get(source)) if function else row.get(source))
+                      for name, source, function in cells}
+            for step in late:
+                if isinstance(step, tuple):
+                    result[step[0]] = step[1](result)
+                elif not step(result):
+                    return None
+            return result
+
+        self.compiled[header] = run
+        return run
+
+    def __call__(self, row):
+        function = (self.compiled.get(self.header)
+                    if self.header
+                    else self.compiled.get(tuple(row.keys())))
+        return (function or self.compile(self.header or row.keys()))(row)
+
+def _key_function(key):
+    """Return a function getting a join or grouping key from a row.
+    The key may be a column name, a tuple of column names, or a function."""
+    if callable(key):
+        return key
+    if isinstance(key, (tuple, list)):
+        return lambda row: tuple(row.get(column) for column in key)
+    return lambda row: row.get(key)
+
+def _rows_of(table):
+    """Return the rows of a table, which may be an iterable of rows, or
+    a dict of rows or of collections of rows as storage.read_csv returns."""
+    if not isinstance(table, dict):
+        return table
+    return (row
+            for value in table.values()
+            for row in (value if isinstance(value, (set, frozenset, list)) else (value,)))
+
+def _index(rows, key_function):
+    """Return a dict of lists of rows, keyed by the key function."""
+    index = {}
+    for row in rows:
+        index.setdefault(key_function(row), []).append(row)
+    return index
+
+def hash_join(left, right, left_key, right_key=None, how='inner'):
+    """Yield the rows made by joining two tables on key columns.
+
+    The tables may be iterables of row dicts, or dicts such as
+    storage.read_csv returns.  Each joined row has the cells of the
+    left row and of the right row, with the right row's taking
+    precedence.  If how is 'left', left rows with no match are also
+    given, on their own.
+
+    A hash table is built on the smaller side if both have lengths,
+    otherwise on the right, and the other side is streamed through."""
+    left_function = _key_function(left_key)
+    right_function = _key_function(right_key or left_key)
+    if (hasattr(left, '__len__') and hasattr(right, '__len__')
+        and len(left) < len(right)):
+        index = _index(_rows_of(left), left_function)
+        matched = set()
+        for right_row in _rows_of(right):
+            key = right_function(right_row)
+            for left_row in index.get(key, ()):
+                yield {**left_row, **right_row}
+            if key in index:
+                matched.add(key)
+        if how == 'left':
+            for key, left_rows in index.items():
+                if key not in matched:
+                    yield from (dict(left_row) for left_row in left_rows)
+        return
+    index = _index(_rows_of(right), right_function)
+    for left_row in _rows_of(left):
+        right_rows = index.get(left_function(left_row))
+        if right_rows:
+            for right_row in right_rows:
+                yield {**left_row, **right_row}
+        elif how == 'left':
+            yield dict(left_row)
+
+def merge_join(left, right, left_key, right_key=None, how='inner'):
+    """Yield the rows made by joining two tables already sorted by their key columns.
+
+    The arguments and results are as for hash_join, but only the
+    rows for one key from each side are held at a time."""
+    left_groups = itertools.groupby(_rows_of(left), _key_function(left_key))
+    right_groups = itertools.groupby(_rows_of(right), _key_function(right_key or left_key))
+    right_key_value, right_rows = next(right_groups, (None, None))
+    right_rows = right_rows and list(right_rows)
+    for left_key_value, left_rows in left_groups:
+        while right_rows is not None and right_key_value < left_key_value:
+            right_key_value, right_rows = next(right_groups, (None, None))
+            right_rows = right_rows and list(right_rows)
+        if right_rows is not None and right_key_value == left_key_value:
+            for left_row in left_rows:
+                for right_row in right_rows:
+                    yield {**left_row, **right_row}
+        elif how == 'left':
+            yield from (dict(left_row) for left_row in left_rows)
+
+class Aggregator(abc.ABC):
+
+    """An incremental aggregation of the values in a column."""
+
+    def __init__(self):
+        self.value = None
+
+    @abc.abstractmethod
+    def add(self, value):
+        """Include a value in the aggregation."""
+
+    def result(self):
+        return self.value
+
+class Sum(Aggregator):
+
+    def __init__(self):
+        self.value = 0
+
+    def add(self, value):
+        self.value += value
+
+class Count(Aggregator):
+
+    def __init__(self):
+        self.value = 0
+
+    def add(self, value):
+        self.value += 1
+
+class Min(Aggregator):
+
+    def add(self, value):
+        if self.value is None or value < self.value:
+            self.value = value
+
+class Max(Aggregator):
+
+    def add(self, value):
+        if self.value is None or value > self.value:
+            self.value = value
+
+class First(Aggregator):
+
+    def __init__(self):
+        self.value = None
+        self.seen = False
+
+    def add(self, value):
+        if not self.seen:
+            self.value = value
+            self.seen = True
+
+class Last(Aggregator):
+
+    def add(self, value):
+        self.value = value
+
+AGGREGATORS = {
+    'sum': Sum,
+    'count': Count,
+    'min': Min,
+    'max': Max,
+    'first': First,
+    'last': Last,
+}
+
+def group_by(rows, key, aggregations, presorted=False):
+    """Yield a row for each group of rows with the same key,
+    with the key columns and the aggregated columns.
+
+    The key is a column name, a tuple of column names, or a function
+    (in which case the result rows have the key in a 'Key' column).
+    The aggregations are a dict of result column names to tuples of
+    an aggregator name from AGGREGATORS (or an Aggregator class),
+    the column to aggregate, and, optionally, a function to convert
+    the cells before aggregating them:
+
+        group_by(rows, ('Month', 'Account'),
+                 {'Total': ('sum', 'Amount', float),
+                  'Entries': ('count', 'Amount')})
+
+    Empty cells are not aggregated.  Only the aggregators are kept
+    for each group, and if the rows are already sorted by the key
+    (presorted), each group's row is given as soon as the group ends."""
+    key_function = _key_function(key)
+    specs = [(name, AGGREGATORS.get(spec[0], spec[0]), spec[1],
+              spec[2] if len(spec) > 2 else None)
+             for name, spec in aggregations.items()]
+
+    def new_group():
+        return [(name, aggregator(), column, convert)
+                for name, aggregator, column, convert in specs]
+
+    def accumulate(group, row):
+        for _name, aggregator, column, convert in group:
+            value = row.get(column)
+            if value is not None and value != "":
+                aggregator.add(convert(value) if convert else value)
+
+    def result(key_value, group):
+        key_cells = (dict(zip(key, key_value))
+                     if isinstance(key, (tuple, list))
+                     else {'Key' if callable(key) else key: key_value})
+        return key_cells | {name: aggregator.result()
+                            for name, aggregator, _column, _convert in group}
+
+    if presorted:
+        for key_value, group_rows in itertools.groupby(rows, key_function):
+            group = new_group()
+            for row in group_rows:
+                accumulate(group, row)
+            yield result(key_value, group)
+        return
+    groups = {}
+    for row in rows:
+        key_value = key_function(row)
+        if (group := groups.get(key_value)) is None:
+            group = groups[key_value] = new_group()
+        accumulate(group, row)
+    for key_value, group in groups.items():
+        yield result(key_value, group)
@@ -1,25 +1,41 @@
 """Some date and time handling functions."""
 
+import bisect
 import calendar
 import datetime
+import functools
+import itertools
 import re
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 ISO_DATE = re.compile("[0-9]{4}-[0-9]{2}-[0-9]{2}")
 SLASHED_DATE = re.compile("[0-9]{4}/[0-9]{2}/[0-9]{2}")
-BACKWARDS_DATE = re.compile("[0-9]{d}/[0-9]{2}/[0-9]{4}")
+BACKWARDS_DATE = re.compile("[0-9]{2}/[0-9]{2}/[0-9]{4}")
+
+# All the formats above, so that one match finds which one a string is in.
+ANY_DATE = re.compile("|".join(f"(?P<{name}>{pattern.pattern})"
+                               for name, pattern in (("iso", ISO_DATE),
+                                                     ("slashed", SLASHED_DATE),
+                                                     ("backwards", BACKWARDS_DATE))))
+
+# How many distinct strings the cached date functions remember.
+DATE_MEMO_SIZE = 65536
 
 def normalize_date(date_in):
-    if ISO_DATE.match(date_in):
+    match = ANY_DATE.match(date_in)
+    if match is None or match.lastgroup == "iso":
         return date_in
-    if SLASHED_DATE.match(date_in):
+    if match.lastgroup == "slashed":
         return date_in.replace('/', '-')
-    if BACKWARDS_DATE.match(date_in):
-        return f"{date_in[6:10]}-{date_in[3:5]}-{date_in[0:2]}"
-    return date_in
+    return f"{date_in[6:10]}-{date_in[3:5]}-{date_in[0:2]}"
 
 def as_datetime(date_in):
     """Get a datetime from a string, a date, or a datetime."""
-    return (datetime.datetime.fromisoformat(datetime)
+    return (datetime.datetime.fromisoformat(date_in)
             if isinstance(date_in, str)
             else (datetime.datetime.combine(date_in, datetime.time())
                   if isinstance(date_in, datetime.date)
@@ -29,10 +45,74 @@ def as_date(date_in):
     """Get a date from a string, a date, or a datetime."""
     return (datetime.date.fromisoformat(date_in)
             if isinstance(date_in, str)
-            else (date_in.date
+            else (date_in.date()
                   if isinstance(date_in, datetime.datetime)
                   else date_in))
 
+cached_normalize_date = functools.lru_cache(maxsize=DATE_MEMO_SIZE)(normalize_date)
+
+@functools.lru_cache(maxsize=DATE_MEMO_SIZE)
+def _date_from_string(date_in):
+    return datetime.date.fromisoformat(normalize_date(date_in))
+
+@functools.lru_cache(maxsize=DATE_MEMO_SIZE)
+def _datetime_from_string(date_in):
+    return datetime.datetime.fromisoformat(normalize_date(date_in))
+
+def cached_as_date(date_in):
+    """Get a date as for as_date, remembering the results for strings,
+    which may be in any of the formats normalize_date handles."""
+    return (_date_from_string(date_in)
+            if isinstance(date_in, str)
+            else as_date(date_in))
+
+def cached_as_datetime(date_in):
+    """Get a datetime as for as_datetime, remembering the results for strings,
+    which may be in any of the formats normalize_date handles."""
+    return (_datetime_from_string(date_in)
+            if isinstance(date_in, str)
+            else as_datetime(date_in))
+
+def normalize_dates(dates_in):
+    """Return a list of normalized date strings from an iterable of them."""
+    return [cached_normalize_date(date_in) for date_in in dates_in]
+
+def _require_numpy():
+    """Raise ImportError if NumPy, needed for datetime64 results, is missing."""
+    if numpy is None:
+        raise ImportError("datetime64 results need NumPy, which is not installed")
+
+def as_dates(dates_in, datetime64=False):
+    """Return a list of dates from an iterable of strings, dates, or datetimes.
+    If datetime64 is true, return a NumPy datetime64 array instead."""
+    if datetime64:
+        _require_numpy()
+    dates = [cached_as_date(date_in) for date_in in dates_in]
+    return (numpy.array(dates, dtype='datetime64[D]')
+            if datetime64
+            else dates)
+
+def as_datetimes(dates_in, datetime64=False):
+    """Return a list of datetimes from an iterable of strings, dates, or datetimes.
+    If datetime64 is true, return a NumPy datetime64 array instead."""
+    if datetime64:
+        _require_numpy()
+    datetimes = [cached_as_datetime(date_in) for date_in in dates_in]
+    return (numpy.array(datetimes, dtype='datetime64[us]')
+            if datetime64
+            else datetimes)
+
+def normalizing_dates(*columns):
+    """Return a function to normalize the dates in the given columns of a row,
+    for use as the transform_row argument of storage.read_csv."""
+    columns = columns or ('Date',)
+    def normalize_row(row):
+        return {**row,
+                **{column: cached_normalize_date(row[column])
+                   for column in columns
+                   if row.get(column)}}
+    return normalize_row
+
 def back_from(when, years_back=0, months_back=0, days_back=0):
     if isinstance(when, str):
         when = datetime.date.fromisoformat(when)
@@ -89,3 +169,55 @@ def entries_between_dates(incoming, starting, ending):
     return [entry
             for entry in incoming
             if starting <= as_date(entry['Date']) <= ending]
+
+class DateIndex:
+
+    """A collection of entries sorted by date, for repeated date queries.
+
+    The entries may be a list of dicts, or a dict of entries or of
+    sets of entries, such as storage.read_csv returns when keyed on
+    the date column.  The dates are parsed once, when the index is made.
+    """
+
+    def __init__(self, entries, date_column='Date'):
+        if isinstance(entries, dict):
+            entries = itertools.chain.from_iterable(
+                (value
+                 if isinstance(value, (set, frozenset, list))
+                 else [value])
+                for value in entries.values())
+        dated = sorted(((cached_as_date(entry[date_column]), entry)
+                        for entry in entries),
+                       key=lambda pair: pair[0])
+        self.dates = [date for date, _ in dated]
+        self.entries = [entry for _, entry in dated]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def between(self, starting, ending):
+        "Return the entries between two given dates, inclusive."
+        return self.entries[bisect.bisect_left(self.dates, as_date(starting))
+                            :bisect.bisect_right(self.dates, as_date(ending))]
+
+    def before(self, when):
+        "Return the entries before a given date."
+        return self.entries[:bisect.bisect_left(self.dates, as_date(when))]
+
+    def after(self, when):
+        "Return the entries after a given date."
+        return self.entries[bisect.bisect_right(self.dates, as_date(when)):]
+
+    def _buckets(self, key):
+        """Return a dict of lists of entries grouped by a function of their dates."""
+        return {bucket: [entry for _, entry in group]
+                for bucket, group in itertools.groupby(zip(self.dates, self.entries),
+                                                       key=lambda pair: key(pair[0]))}
+
+    def by_month(self):
+        "Return a dict of lists of entries, keyed by (year, month)."
+        return self._buckets(lambda date: (date.year, date.month))
+
+    def by_year(self):
+        "Return a dict of lists of entries, keyed by year."
+        return self._buckets(lambda date: date.year)
@@ -1,12 +1,178 @@
 """Output begin and end messages."""
 
+import contextvars
 import datetime
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
 
-message_prefixes_as_list = list()
+# The nesting state is per thread and per asyncio task, so that
+# concurrent work does not mix up its indentation or its spans.
+message_prefixes = contextvars.ContextVar("message_prefixes", default=())
+current_span = contextvars.ContextVar("current_span", default=None)
+# The collector that BeginAndEndMessages records spans into, if any.
+active_collector = contextvars.ContextVar("active_collector", default=None)
+# Where BeginAndEndMessages output goes, if it is being buffered.
+output_buffer = contextvars.ContextVar("output_buffer", default=None)
 
 ONE_MINUTE = datetime.timedelta(seconds=60)
 ONE_SECOND = datetime.timedelta(seconds=1)
 
+_output_lock = threading.Lock()
+
+def emit(line):
+    """Output a line, or buffer it if in a BufferedOutput context."""
+    if (buffer := output_buffer.get()) is not None:
+        buffer.append(line)
+    else:
+        print(line)
+
+def in_current_context(function):
+    """Return a function that runs the given one in a copy of the current context,
+    so that work passed to a thread pool nests inside the caller's
+    messages and spans."""
+    context = contextvars.copy_context()
+    def run_in_context(*args, **kwargs):
+        return context.copy().run(function, *args, **kwargs)
+    return run_in_context
+
+class BufferedOutput:
+
+    """Buffer the messages output in this context, and output them all
+    together at the end, so that the messages of concurrent workers
+    are not interleaved."""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.lines = []
+        self.token = None
+
+    def __enter__(self):
+        self.token = output_buffer.set(self.lines)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        output_buffer.reset(self.token)
+        if (outer := output_buffer.get()) is not None:
+            outer.extend(self.lines)
+        elif self.lines:
+            stream = self.stream or sys.stdout
+            with _output_lock:
+                stream.write("".join(line + "\n" for line in self.lines))
+                stream.flush()
+        self.lines.clear()
+
+class Span:
+
+    """A timed step of a run, with the steps nested inside it."""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.attributes = {}
+        self.thread = threading.get_ident()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.memory_delta = None
+        self.abandoned = False
+
+    def duration_ns(self):
+        return (self.end_ns or time.perf_counter_ns()) - self.start_ns
+
+    def as_dict(self):
+        """Return the span and the spans within it as a JSON-compatible dict."""
+        result = {'name': self.name,
+                  'duration_ns': self.duration_ns()}
+        if self.abandoned:
+            result['abandoned'] = True
+        if self.memory_delta is not None:
+            result['memory_delta'] = self.memory_delta
+        if self.attributes:
+            result['attributes'] = self.attributes
+        if self.children:
+            result['children'] = [child.as_dict() for child in self.children]
+        return result
+
+    def trace_events(self, origin_ns):
+        """Yield Chrome trace-event format complete events for the span
+        and those within it."""
+        yield {'name': self.name,
+               'ph': "X",
+               'ts': (self.start_ns - origin_ns) / 1000,
+               'dur': self.duration_ns() / 1000,
+               'pid': os.getpid(),
+               'tid': self.thread,
+               'args': self.attributes | ({'memory_delta': self.memory_delta}
+                                          if self.memory_delta is not None
+                                          else {})}
+        for child in self.children:
+            yield from child.trace_events(origin_ns)
+
+class ProfileCollector:
+
+    """Collect the spans of any BeginAndEndMessages in this context.
+
+    If trace_memory is true, tracemalloc is used to record how much
+    the memory in use changed during each span."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.roots = []
+        self.lock = threading.Lock()
+        self.started_tracing = False
+        self.token = None
+        self.origin_ns = None
+
+    def __enter__(self):
+        self.token = active_collector.set(self)
+        self.origin_ns = time.perf_counter_ns()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        active_collector.reset(self.token)
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def begin(self, name, parent=None):
+        """Start a span inside the parent one, or at the top level."""
+        span = Span(name, parent)
+        with self.lock:
+            (parent.children if parent else self.roots).append(span)
+        if self.trace_memory:
+            span.memory_delta = tracemalloc.get_traced_memory()[0]
+        return span
+
+    def end(self, span, abandoned=False):
+        """Finish a span."""
+        span.end_ns = time.perf_counter_ns()
+        span.abandoned = abandoned
+        if self.trace_memory:
+            span.memory_delta = tracemalloc.get_traced_memory()[0] - span.memory_delta
+
+    def as_dicts(self):
+        """Return the spans as a list of JSON-compatible dicts."""
+        return [root.as_dict() for root in self.roots]
+
+    def to_json(self, **kwargs):
+        """Return the spans as a JSON string."""
+        return json.dumps(self.as_dicts(), **kwargs)
+
+    def to_chrome_trace(self):
+        """Return the spans in Chrome trace-event format, as a dict
+        which can be written as JSON and loaded into a trace viewer."""
+        return {'traceEvents': [event
+                                for root in self.roots
+                                for event in root.trace_events(self.origin_ns)],
+                'displayTimeUnit': "ms"}
+
 class BeginAndEndMessages:
 
     """Run some code with nested begin and end/abandoned messages."""
@@ -18,25 +184,43 @@ class BeginAndEndMessages:
         self.about = about
         self.margin = margin
         self.started = None
+        self.span = None
+        self.collector = None
+        self.prefix_token = None
+        self.span_token = None
         self._set_prefix()
 
     def _set_prefix(self):
-        self.prefix = "".join(message_prefixes_as_list)
+        self.prefix = "".join(message_prefixes.get())
 
     def __enter__(self):
+        self._set_prefix()
         if self.verbose:
-            print(self.prefix + "Beginning", self.about)
-        message_prefixes_as_list.append(self.margin)
+            emit(self.prefix + "Beginning " + self.about)
+        self.prefix_token = message_prefixes.set(message_prefixes.get() + (self.margin,))
         self._set_prefix()
-        self.started = datetime.datetime.now()
+        if (collector := active_collector.get()) is not None:
+            self.collector = collector
+            self.span = collector.begin(self.about, current_span.get())
+            self.span_token = current_span.set(self.span)
+        self.started = time.perf_counter_ns()
         return self
 
     def print(self, text):
-        print(self.prefix + text)
+        emit(self.prefix + text)
+
+    def set(self, **attributes):
+        """Record attributes, such as row counts, on the profiling span, if any."""
+        if self.span:
+            self.span.attributes.update(attributes)
 
     def __exit__(self, exc_type, _exc_val, _exc_tb):
-        time_taken = datetime.datetime.now() - self.started
-        message_prefixes_as_list.pop()
+        time_taken = datetime.timedelta(
+            microseconds=(time.perf_counter_ns() - self.started) / 1000)
+        if self.span:
+            self.collector.end(self.span, abandoned=exc_type is not None)
+            current_span.reset(self.span_token)
+        message_prefixes.reset(self.prefix_token)
         self._set_prefix()
         if self.verbose:
             message = self.prefix + ("Abandoned " if exc_type else "Finished ") + self.about
@@ -44,4 +228,4 @@ class BeginAndEndMessages:
                 message += " in %s" % time_taken
             elif time_taken >= ONE_SECOND:
                 message += " in %.3g sec" % time_taken.total_seconds()
-            print(message)
+            emit(message)
@@ -9,32 +9,151 @@ All the functions using filenames expand environment variables and '~'
 in the names.
 """
 
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from frozendict import frozendict
+import asyncio
+import bz2
+import concurrent.futures
+import contextlib
+import copy
 import csv
+import functools
 import glob
+import gzip
+import hashlib
+import itertools
+import io
 import json
+import locale
+import lzma
+import mmap
 import os
+import pickle
 import re
+import shutil
 import tempfile
+import threading
+import time
 import yaml
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import dobishem.columnar
+import dobishem.compact
 import dobishem.tabular_text
 
 def _expand(filename):
     """Expand environment variables and '`~' in a filename."""
     return os.path.expandvars(os.path.expanduser(filename))
 
+COMPRESSIONS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+    }
+
+if zstandard is not None:
+    COMPRESSIONS[".zst"] = zstandard.open
+
+def compression_opener(filename):
+    """Return the function for opening a file through its compression, or None."""
+    return COMPRESSIONS.get(os.path.splitext(filename)[1])
+
+def format_extension(filename):
+    """Return the extension giving the format of a file, looking through
+    any compression extension, so that "ledger.csv.gz" gives ".csv"."""
+    stem, extension = os.path.splitext(filename)
+    return (os.path.splitext(stem)[1]
+            if extension in COMPRESSIONS
+            else extension)
+
+def _open_compressed(opener, full_name, mode, kwargs):
+    """Open a compressed file, in text mode unless binary is asked for."""
+    return opener(full_name,
+                  mode if 'b' in mode else mode.replace('t', '') + 't',
+                  **{key: value
+                     for key, value in kwargs.items()
+                     if key in ('encoding', 'errors', 'newline')})
+
 def open_for_read(filename, *args, **kwargs):
-    """Return an input stream for the named file."""
-    return open(_expand(filename), *args, **kwargs)
+    """Return an input stream for the named file.
+    Compressed files are decompressed as they are read."""
+    full_name = _expand(filename)
+    if (opener := compression_opener(full_name)):
+        return _open_compressed(opener, full_name,
+                                args[0] if args else kwargs.pop('mode', 'r'),
+                                kwargs)
+    return open(full_name, *args, **kwargs)
 
 def open_for_write(filename, *args, **kwargs):
     """Return an output stream to the named file.
-    If necessary, create the directory the file is to go into."""
+    If necessary, create the directory the file is to go into.
+    Files with a compression extension are compressed as they are written."""
     full_name = _expand(filename)
     os.makedirs(os.path.dirname(full_name), exist_ok=True)
+    if (opener := compression_opener(full_name)):
+        return _open_compressed(opener, full_name, 'w', kwargs)
     return open(full_name, 'w', *args, **kwargs)
 
+def open_for_append(filename, *args, **kwargs):
+    """Return an output stream adding to the end of the named file,
+    creating the file and its directory if necessary.
+    Files with a compression extension get a new compressed section."""
+    full_name = _expand(filename)
+    os.makedirs(os.path.dirname(full_name), exist_ok=True)
+    if (opener := compression_opener(full_name)):
+        return _open_compressed(opener, full_name, 'a', kwargs)
+    return open(full_name, 'a', *args, **kwargs)
+
+def iter_csv(
+        filename,
+        row_type=dict,
+        empty_for_missing=True,
+        transform_row=None,
+):
+    """Return an iterator over the rows of a CSV file.
+
+    The rows are read one at a time as the iterator is consumed, so
+    memory use does not depend on the size of the file.  The row_type
+    and transform_row arguments are as for read_csv.
+    """
+    if not os.path.exists(_expand(filename)):
+        if empty_for_missing:
+            return iter(())
+        raise FileNotFoundError(filename)
+    return _iter_csv_rows(filename, row_type, transform_row)
+
+def _iter_csv_rows(filename, row_type, transform_row):
+    """Yield the rows of a CSV file, transforming them as they go past."""
+    with open_for_read(filename) as instream:
+        rows = (_compact_rows(csv.reader(instream))
+                if issubclass(row_type, dobishem.compact.CompactRow)
+                else csv.DictReader(instream)
+                if issubclass(row_type, dict)
+                else ((tuple(row) for row in csv.reader(instream))
+                      if issubclass(row_type, tuple)
+                      else csv.reader(instream)))
+        if transform_row:
+            for raw in rows:
+                if (row := transform_row(raw)):
+                    yield row
+        else:
+            yield from rows
+
+def _compact_rows(reader):
+    """Yield CompactRows from a csv reader, taking the header from its first row."""
+    make = dobishem.compact.row_class(tuple(next(reader, ()))).make
+    for values in reader:
+        yield make(values)
+
 def read_csv(
         filename,
         result_type=list,
@@ -48,59 +167,207 @@ def read_csv(
     list: a list of rows (key column is ignored)
     dict: a dictionary of rows, keyed by the key column
     set: a dictionary of sets of rows, keyed by the key column
+    iter: an iterator yielding the rows lazily (key column is ignored)
+    ColumnTable: a dobishem.columnar.ColumnTable (key column is ignored)
 
     The elements of the structure are tuples, lists or dicts,
-    according to row_type.
+    according to row_type.  If row_type is
+    dobishem.compact.CompactRow, they are tuples sharing a header,
+    which can also be read like dicts, and in which equal values are
+    shared between rows.
 
     If a function is given for the transform_row argument, it is
     called on each row, and its result is used instead of the original
     row.  If it returns a false value for a row, that row is not used.
     """
-    if not os.path.exists(_expand(filename)):
+    rows = iter_csv(filename,
+                    row_type=row_type,
+                    empty_for_missing=empty_for_missing,
+                    transform_row=transform_row)
+    return _collect_rows(rows, result_type, key_column)
+
+def _collect_rows(rows, result_type, key_column):
+    """Gather an iterator of rows into a structure as for read_csv."""
+    if result_type is iter:
+        return rows
+    if issubclass(result_type, dobishem.columnar.ColumnTable):
+        return result_type.from_rows(rows)
+    if issubclass(result_type, set):
+        result = defaultdict(set)
+        for row in rows:
+            result[row[key_column]].add(row
+                                        if isinstance(row, dobishem.compact.CompactRow)
+                                        else frozendict(row))
+        return result
+    return ({row[key_column]: row
+             for row in rows}
+            if issubclass(result_type, dict)
+            else list(rows))
+
+def _record_boundary(mapped, start, target):
+    """Return the offset of the first record boundary at or after target.
+
+    Quote characters are counted from start, which must itself be a
+    record boundary, so that newlines inside quoted fields are skipped."""
+    quoted = mapped[start:target].count(b'"') % 2
+    position = target
+    while True:
+        newline = mapped.find(b'\n', position)
+        if newline == -1:
+            return len(mapped)
+        quoted ^= mapped[position:newline].count(b'"') % 2
+        if not quoted:
+            return newline + 1
+        position = newline + 1
+
+def _csv_chunk_boundaries(mapped, start, chunks):
+    """Return the (start, end) offsets of up to the given number of chunks
+    of whole records, from start to the end of the mapped file."""
+    boundaries = [start]
+    size = len(mapped)
+    step = max(1, (size - start) // chunks)
+    while boundaries[-1] < size:
+        boundaries.append(_record_boundary(mapped,
+                                           boundaries[-1],
+                                           min(size, boundaries[-1] + step)))
+    return list(zip(boundaries, boundaries[1:]))
+
+def _parse_csv_chunk(filename, start, end, encoding, fieldnames, row_type, transform_row):
+    """Parse the records between two offsets of a CSV file.
+    This runs in a worker process for read_csv_parallel."""
+    with open(filename, 'rb') as instream:
+        with mmap.mmap(instream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            text = io.StringIO(mapped[start:end].decode(encoding), newline='')
+    rows = ((dobishem.compact.row_class(tuple(fieldnames)).make(values)
+             for values in csv.reader(text))
+            if issubclass(row_type, dobishem.compact.CompactRow)
+            else csv.DictReader(text, fieldnames=fieldnames)
+            if issubclass(row_type, dict)
+            else ((tuple(row) for row in csv.reader(text))
+                  if issubclass(row_type, tuple)
+                  else csv.reader(text)))
+    return ([row
+             for raw in rows
+             if (row := transform_row(raw))]
+            if transform_row
+            else list(rows))
+
+def read_csv_parallel(
+        filename,
+        result_type=list,
+        row_type=dict,
+        key_column=None,
+        empty_for_missing=True,
+        transform_row=None,
+        max_workers=None,
+        chunks_per_worker=4,
+        min_chunk_size=1 << 20,
+        encoding=None,
+):
+    """Read a CSV file as for read_csv, parsing it in a pool of processes.
+
+    The file is memory-mapped and split into chunks at record
+    boundaries (allowing for newlines inside quoted fields), and the
+    chunks are parsed in separate processes, the rows being returned
+    in their original order.  The transform_row function is run in the
+    worker processes, so it must be picklable, that is, defined at the
+    top level of a module.
+
+    Files smaller than min_chunk_size, and compressed files, which
+    cannot be split without decompressing them, are read in this process.
+    """
+    full_name = _expand(filename)
+    if not os.path.exists(full_name):
         if empty_for_missing:
-            return result_type()
+            return _collect_rows(iter(()), result_type, key_column)
         raise FileNotFoundError(filename)
-    with open_for_read(filename) as instream:
-        rows = list(csv.DictReader(instream)
-                    if issubclass(row_type, dict)
-                    else ((tuple(row) for row in csv.reader(instream))
-                          if issubclass(row_type, tuple)
-                          else csv.reader(instream)))
-        if transform_row:
-            rows = [row
-                    for raw in rows
-                    if (row := transform_row(raw))]
-        if issubclass(result_type, set):
-            result = defaultdict(set)
-            for row in rows:
-                result[row[key_column]].add(frozendict(row))
-            return result
-        return ({row[key_column]: row
-                 for row in rows}
-                if issubclass(result_type, dict)
-                else rows)
+    if (compression_opener(full_name)
+        or os.path.getsize(full_name) < min_chunk_size):
+        return read_csv(filename,
+                        result_type=result_type,
+                        row_type=row_type,
+                        key_column=key_column,
+                        transform_row=transform_row)
+    encoding = encoding or locale.getpreferredencoding(False)
+    max_workers = max_workers or os.cpu_count() or 1
+    with open(full_name, 'rb') as instream:
+        with mmap.mmap(instream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            fieldnames = None
+            start = 0
+            if issubclass(row_type, (dict, dobishem.compact.CompactRow)):
+                start = _record_boundary(mapped, 0, 0)
+                fieldnames = next(csv.reader(io.StringIO(mapped[:start].decode(encoding),
+                                                         newline='')))
+            chunks = _csv_chunk_boundaries(
+                mapped, start,
+                max(1, min(max_workers * chunks_per_worker,
+                           (len(mapped) - start) // min_chunk_size)))
+    rows = _parallel_csv_rows(full_name, chunks, max_workers,
+                              encoding, fieldnames, row_type, transform_row)
+    return _collect_rows(rows, result_type, key_column)
+
+def _parallel_csv_rows(filename, chunks, max_workers,
+                       encoding, fieldnames, row_type, transform_row):
+    """Yield the rows of the chunks of a CSV file, parsed in a process pool."""
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for chunk_rows in executor.map(_parse_csv_chunk,
+                                       *zip(*((filename, start, end, encoding,
+                                               fieldnames, row_type, transform_row)
+                                              for start, end in chunks))):
+            yield from chunk_rows
 
 def default_read_csv(filename):
     """Read a CSV file as for a list of dated entries."""
     return read_csv(filename, key_column='Date')
 
+def default_iter_csv(filename):
+    """Iterate over a CSV file as for a list of dated entries."""
+    return iter_csv(filename)
+
 def column_headers(table):
     """Return the column headers of a table."""
     return (set().union(*(set(row.keys())
                           for row in table)))
 
+def _ordered_columns(columns, column_order):
+    """Return the columns, with any given in column_order first."""
+    return ([col for col in column_order if col in columns]
+            + sorted(set(columns) - set(column_order)))
+
+def _is_dict_row(row):
+    """Return whether a row is read by column name, rather than by position."""
+    return isinstance(row, (dict, dobishem.compact.CompactRow))
+
+def _is_iterator(data):
+    """Return whether data is a one-shot iterator rather than a collection."""
+    return iter(data) is data
+
 def write_csv(
         filename,
         data,
         flatten=False,
         sort_columns=None,
         silently_skip_missing_data=True,
+        fieldnames=None,
 ):
     """Write a CSV file from a list or dict of lists or dicts,
     or, if flatten is true, a dict or list of collections
-    of dicts or lists."""
+    of dicts or lists.
+
+    If the data is an iterator, such as a generator, it is written
+    by stream_csv without being held in memory; in that case the rows
+    are not sorted, and sort_columns only sets the column order, and
+    the number of rows written is returned instead of the data."""
     if sort_columns is None:
         sort_columns = []
+    if _is_iterator(data):
+        return stream_csv(filename,
+                          (itertools.chain.from_iterable(data)
+                           if flatten
+                           else data),
+                          fieldnames=fieldnames,
+                          column_order=sort_columns,
+                          skip_empty=silently_skip_missing_data)
     if silently_skip_missing_data and not data:
         return data
     rows_or_groups = (data.values()
@@ -111,14 +378,15 @@ def write_csv(
                                for row in rows_or_groups))
                 if flatten
                 else rows_or_groups)
-    rows_are_dicts = isinstance(rows[0], dict)
+    rows_are_dicts = _is_dict_row(rows[0])
     if sort_columns:
         rows = sorted(rows, key=lambda row: [row.get(k, "") for k in sort_columns])
     with open_for_write(filename) as outstream:
         writer = (csv.DictWriter(outstream,
-                                 fieldnames=(sort_columns
-                                             + sorted(column_headers(rows)
-                                                 - set(sort_columns))))
+                                 fieldnames=(fieldnames
+                                             or (sort_columns
+                                                 + sorted(column_headers(rows)
+                                                          - set(sort_columns)))))
                   if rows_are_dicts
                   else csv.writer(outstream))
         if rows_are_dicts:
@@ -127,8 +395,81 @@ def write_csv(
             writer.writerow(row)
     return data
 
+def _unpickled(stream):
+    """Yield the objects pickled one after another into a stream."""
+    while True:
+        try:
+            yield pickle.load(stream)
+        except EOFError:
+            return
+
+def stream_csv(
+        filename,
+        rows,
+        fieldnames=None,
+        column_order=None,
+        sample_size=1000,
+        spill=True,
+        skip_empty=False,
+):
+    """Write a CSV file from an iterable of rows, writing them as they arrive.
+
+    If the rows are dicts and no fieldnames are given, the columns are
+    found from the first sample_size rows.  If there are more rows
+    than that and spill is true, all the rows are spilled to a
+    temporary file while the rest of the columns are found, and are
+    written out from there in a second pass.  If spill is false, only
+    the columns of the sample are used, and a later row with any other
+    column raises ValueError.
+
+    Discovered columns named in column_order come first, followed by
+    the rest in alphabetical order.
+
+    If skip_empty is true and there are no rows and no fieldnames,
+    the file is not written at all, as for write_csv with empty data.
+
+    Returns the number of rows written.
+    """
+    rows = iter(rows)
+    sample = list(itertools.islice(rows, sample_size))
+    if skip_empty and not sample and fieldnames is None:
+        return 0
+    rows_are_dicts = (_is_dict_row(sample[0])
+                      if sample
+                      else fieldnames is not None)
+    spilled = None
+    if rows_are_dicts and fieldnames is None:
+        columns = column_headers(sample)
+        if len(sample) == sample_size and spill:
+            spilled = tempfile.TemporaryFile()
+            for row in itertools.chain(sample, rows):
+                columns.update(row.keys())
+                pickle.dump(row, spilled)
+            spilled.seek(0)
+            sample = []
+            rows = _unpickled(spilled)
+        fieldnames = _ordered_columns(columns, column_order or [])
+    count = 0
+    try:
+        with open_for_write(filename) as outstream:
+            if rows_are_dicts:
+                writer = csv.DictWriter(outstream, fieldnames=fieldnames)
+                writer.writeheader()
+            else:
+                writer = csv.writer(outstream)
+            for row in itertools.chain(sample, rows):
+                writer.writerow(row)
+                count += 1
+    finally:
+        if spilled:
+            spilled.close()
+    return count
+
 def default_write_csv(filename, data):
     """Write a CSV file as for a list of dated entries."""
+    if _is_iterator(data):
+        return write_csv(filename, data,
+                         sort_columns=["Date", "Time", "Account", "Item", "Details"])
     columns = column_headers(data)
     return write_csv(
         filename, data,
@@ -148,6 +489,53 @@ def write_json(filename, data):
         json.dump(data, outstream)
     return data
 
+def iter_jsonl(filename, row_filter=None):
+    """Return an iterator over the records of a JSON Lines file,
+    reading them one at a time.  If a row_filter function is given,
+    only the records for which it returns true are included."""
+    if not os.path.exists(_expand(filename)):
+        return iter(())
+    return _iter_jsonl_records(filename, row_filter)
+
+def _iter_jsonl_records(filename, row_filter):
+    """Yield the records of a JSON Lines file."""
+    with open_for_read(filename) as instream:
+        for line in instream:
+            if line.strip():
+                record = json.loads(line)
+                if row_filter is None or row_filter(record):
+                    yield record
+
+def read_jsonl(filename, row_filter=None):
+    """Read a JSON Lines file, optionally keeping only the records for
+    which row_filter returns true."""
+    return list(iter_jsonl(filename, row_filter))
+
+def _write_jsonl_records(outstream, data):
+    """Write records to a stream as JSON Lines, returning how many were written."""
+    count = 0
+    for record in data:
+        outstream.write(json.dumps(record) + "\n")
+        count += 1
+    return count
+
+def write_jsonl(filename, data):
+    """Write a JSON Lines file.
+    If the data is an iterator, it is written as it arrives, and the
+    number of records written is returned instead of the data."""
+    with open_for_write(filename) as outstream:
+        count = _write_jsonl_records(outstream, data)
+    return count if _is_iterator(data) else data
+
+def append_jsonl(filename, data):
+    """Add records to the end of a JSON Lines file, without rewriting it.
+    If the data is an iterator, the number of records written is
+    returned instead of the data."""
+    with open_for_append(filename) as outstream:
+        count = _write_jsonl_records(outstream, data)
+    stat_cache.invalidate(filename)
+    return count if _is_iterator(data) else data
+
 def read_yaml(filename):
     """Read a YAML file."""
     with open_for_read(filename) as instream:
@@ -159,23 +547,45 @@ def write_yaml(filename, data):
         yaml.dump(data, outstream)
     return data
 
-def read_orgtable(filename):
-    """Read an orgtable file."""
-    with open_for_read(filename) as instream:
-        data, _colnames = dobishem.tabular_text.read_tabular_to_dicts(instream)
-        return list(data)
+def read_orgtable(filename, converters=None):
+    """Read an orgtable file.
+    If converters are given, as a dict of column names to functions,
+    the cells in those columns are converted by them."""
+    if compression_opener(filename):
+        with open_for_read(filename) as instream:
+            data, _colnames = dobishem.tabular_text.read_tabular_fast(
+                instream, converters=converters)
+            return list(data)
+    data, _colnames = dobishem.tabular_text.read_tabular_fast(
+        dobishem.tabular_text.mapped_lines(_expand(filename)),
+        converters=converters)
+    return list(data)
 
 def write_orgtable(filename, data):
-    """Write an orgtable file."""
+    """Write an orgtable file.
+    If the data is an iterator, the number of rows written is returned
+    instead of the data."""
     with open_for_write(filename) as outstream:
-        outstream.write(dobishem.tabular_text.dicts_to_tabular_string(data))
-    return data
+        return dobishem.tabular_text.write_tabular(outstream, data)
 
 READERS = {
     ".csv": default_read_csv,
     ".json": read_json,
     ".yaml": read_yaml,
     ".table": read_orgtable,
+    ".jsonl": read_jsonl,
+    }
+
+STREAMING_READERS = {
+    ".csv": default_iter_csv,
+    ".jsonl": iter_jsonl,
+    }
+
+COLUMNAR_READERS = {
+    ".csv": lambda filename: read_csv(filename,
+                                      result_type=dobishem.columnar.ColumnTable),
+    ".table": lambda filename: dobishem.columnar.ColumnTable.from_rows(
+        read_orgtable(filename)),
     }
 
 WRITERS = {
@@ -183,20 +593,219 @@ WRITERS = {
     ".json": write_json,
     ".yaml": write_yaml,
     ".table": write_orgtable,
+    ".jsonl": write_jsonl,
+    }
+
+# Writers that add to the end of an existing file.
+APPENDERS = {
+    ".jsonl": append_jsonl,
     }
 
+def _report(action, filename, verbose, messager):
+    """Output a message about a file, if verbose."""
+    if verbose:
+        if messager:
+            messager.print(f"{action} {filename}")
+        else:
+            print(action, filename)
+
+class ParseCache:
+
+    """A cache of the parsed contents of files, kept in a binary form.
+
+    Each entry records the modification time and size of the file it
+    was parsed from, and is used only while those still match.
+
+    If a directory is given, the entries are kept there, and once they
+    take up more than max_bytes, the least recently used ones are
+    removed.  Otherwise, each entry is kept in a hidden file next to
+    the file it was parsed from."""
+
+    def __init__(self, directory=None, max_bytes=1 << 30):
+        self.directory = directory and _expand(directory)
+        self.max_bytes = max_bytes
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def cache_file(self, full_name):
+        """Return the name of the cache file for a source file."""
+        if self.directory:
+            return os.path.join(self.directory,
+                                hashlib.sha256(os.path.abspath(full_name).encode()).hexdigest()
+                                + ".pickle")
+        directory, basename = os.path.split(full_name)
+        return os.path.join(directory, "." + basename + ".pickle")
+
+    def get(self, filename, reader):
+        """Return the parsed contents of a file, using the reader if
+        there is no valid cache entry for it."""
+        full_name = _expand(filename)
+        if not os.path.exists(full_name):
+            return reader(filename)
+        stat = os.stat(full_name)
+        key = (os.path.abspath(full_name), stat.st_mtime_ns, stat.st_size)
+        cache_file = self.cache_file(full_name)
+        try:
+            with open(cache_file, 'rb') as instream:
+                cached_key, data = pickle.load(instream)
+            if cached_key == key:
+                # Only marks the entry as recently used, so failing is harmless.
+                with contextlib.suppress(OSError):
+                    os.utime(cache_file)
+                return data
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            pass
+        data = reader(filename)
+        self.put(cache_file, key, data)
+        return data
+
+    def put(self, cache_file, key, data):
+        """Write a cache entry, replacing any previous one in one step.
+        If the entry cannot be written, the cache simply goes without it."""
+        try:
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_file),
+                                             delete=False) as outstream:
+                try:
+                    pickle.dump((key, data), outstream, protocol=pickle.HIGHEST_PROTOCOL)
+                except BaseException:
+                    outstream.close()
+                    os.remove(outstream.name)
+                    raise
+            os.replace(outstream.name, cache_file)
+            if self.directory:
+                self.evict()
+        except (OSError, pickle.PicklingError):
+            pass
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes.
+        Entries removed meanwhile by another process are passed over."""
+        entries = []
+        with os.scandir(self.directory) as scanner:
+            for entry in scanner:
+                if entry.name.endswith(".pickle"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort(reverse=True)
+        total = 0
+        for _used, size, path in entries:
+            total += size
+            if total > self.max_bytes:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+
+def _frozen(data):
+    """Return an immutable version of some data."""
+    if isinstance(data, dict):
+        return frozendict({key: _frozen(value) for key, value in data.items()})
+    if isinstance(data, (list, tuple)):
+        return tuple(_frozen(item) for item in data)
+    if isinstance(data, set):
+        return frozenset(_frozen(item) for item in data)
+    return data
+
+class MemoryCache:
+
+    """An in-memory least-recently-used cache of the parsed contents of files.
+
+    Entries are checked against the modification time and size of
+    their files on each use.  The cache holds at most max_entries
+    entries, and, if max_bytes is given, at most roughly that much
+    data, going by the sizes of the files.
+
+    If frozen is true, the data is stored and returned as immutable
+    structures (tuples, frozendicts and frozensets), shared between
+    all callers; otherwise each caller gets its own copy.
+
+    The hits and misses counts can be used for tuning the size."""
+
+    def __init__(self, max_entries=128, max_bytes=None, frozen=False):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.frozen = frozen
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, filename, reader):
+        """Return the parsed contents of a file, using the reader if
+        there is no valid cache entry for it."""
+        full_name = _expand(filename)
+        try:
+            stat = os.stat(full_name)
+        except FileNotFoundError:
+            return reader(filename)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(full_name)
+            if entry and entry[0] == key:
+                self.entries.move_to_end(full_name)
+                self.hits += 1
+                return entry[1] if self.frozen else copy.deepcopy(entry[1])
+            self.misses += 1
+        data = reader(filename)
+        stored = _frozen(data) if self.frozen else copy.deepcopy(data)
+        with self.lock:
+            self._remove(full_name)
+            self.entries[full_name] = (key, stored)
+            self.total_bytes += stat.st_size
+            while (len(self.entries) > self.max_entries
+                   or (self.max_bytes is not None
+                       and self.total_bytes > self.max_bytes
+                       and len(self.entries) > 1)):
+                self._remove(next(iter(self.entries)))
+        return stored if self.frozen else data
+
+    def _remove(self, full_name):
+        """Remove an entry, if present."""
+        if (entry := self.entries.pop(full_name, None)):
+            self.total_bytes -= entry[0][1]
+
+    def clear(self):
+        """Remove all the entries and reset the counts."""
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+# The cache used by load() when none is given to it.
+parse_cache = None
+
 def load(
         filename,
         verbose=False,
         messager=None,
+        lazy=False,
+        cache=None,
+        columnar=False,
 ):
-    """Read a file, finding a suitable reader function for the filename."""
-    if verbose:
-        if messager:
-            messager.print(f"Reading {filename}")
-        else:
-            print("Reading", filename)
-    return READERS[os.path.splitext(filename)[1]](filename)
+    """Read a file, finding a suitable reader function for the filename.
+
+    If lazy is true and there is a streaming reader for the file type,
+    an iterator over the entries is returned instead of a list.
+
+    If columnar is true and the file type is tabular, a
+    dobishem.columnar.ColumnTable is returned instead of a list.
+
+    Otherwise, if a ParseCache or MemoryCache is given as cache, or
+    has been set as parse_cache, the parsed contents are taken from it
+    if possible."""
+    _report("Reading", filename, verbose, messager)
+    extension = format_extension(filename)
+    if lazy and extension in STREAMING_READERS:
+        return STREAMING_READERS[extension](filename)
+    if columnar and extension in COLUMNAR_READERS:
+        return COLUMNAR_READERS[extension](filename)
+    cache = cache or parse_cache
+    return (cache.get(filename, READERS[extension])
+            if cache
+            else READERS[extension](filename))
 
 def save(
         filename,
@@ -205,15 +814,225 @@ def save(
         messager=None,
 ):
     """Write a file, finding a suitable writer function for the filename."""
-    if verbose:
-        if messager:
-            messager.print(f"Writing {filename}")
-        else:
-            print("Writing", filename)
-    return WRITERS[os.path.splitext(filename)[1]](filename, data)
+    _report("Writing", filename, verbose, messager)
+    stat_cache.invalidate(filename)
+    return WRITERS[format_extension(filename)](filename, data)
+
+def save_atomically(
+        filename,
+        data,
+        verbose=False,
+        messager=None,
+):
+    """Write a file as for save(), via a temporary file renamed into place,
+    so that readers never see a partly-written file.
+
+    If the writer skips the data (as for empty CSV data), the file
+    is left as it was."""
+    full_name = _expand(filename)
+    directory, basename = os.path.split(full_name)
+    os.makedirs(directory or ".", exist_ok=True)
+    # Write under the real name, so the writer is chosen by it, in a
+    # private directory beside the file; the file itself gets the
+    # permissions the umask gives any new file.
+    scratch = tempfile.mkdtemp(dir=directory or ".", prefix=".")
+    try:
+        temporary = os.path.join(scratch, basename)
+        result = save(temporary, data, verbose=verbose, messager=messager)
+        if os.path.exists(temporary):
+            if os.path.exists(full_name):
+                shutil.copymode(full_name, temporary)
+            os.replace(temporary, full_name)
+            stat_cache.invalidate(full_name)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return result
+
+class WriteBehind:
+
+    """Buffer saves, keeping only the latest data for each file.
+
+    The buffered data is written out (each file atomically, as for
+    save_atomically) when the flush method is called, at the end of a
+    'with' block, every 'interval' seconds if that is given, and when
+    more than max_pending files or max_saves saves are waiting."""
+
+    def __init__(self, interval=None, max_pending=None, max_saves=None,
+                 verbose=False, messager=None):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_saves = max_saves
+        self.verbose = verbose
+        self.messager = messager
+        self.pending = {}
+        self.flushing = {}
+        self.saves = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.timer = None
+        if interval:
+            self.timer = threading.Thread(target=self._flush_periodically, daemon=True)
+            self.timer.start()
+
+    def save(self, filename, data):
+        """Buffer data to be written to a file, replacing any already buffered for it.
+        Return the data, as save() does."""
+        with self.lock:
+            self.pending[_expand(filename)] = data
+            self.saves += 1
+            full = ((self.max_pending is not None and len(self.pending) > self.max_pending)
+                    or (self.max_saves is not None and self.saves > self.max_saves))
+        if full:
+            self.flush()
+        return data
+
+    def buffered(self, filename):
+        """Return whether there is data waiting to be written to a file,
+        and the latest such data."""
+        full_name = _expand(filename)
+        with self.lock:
+            for waiting in (self.pending, self.flushing):
+                if full_name in waiting:
+                    return True, waiting[full_name]
+        return False, None
+
+    def flush(self):
+        """Write out all the buffered data.
+
+        A file that cannot be written is reported, and its data is put
+        back to be tried again at the next flush, unless newer data has
+        been saved for it meanwhile.  Return a dict of the errors, by
+        filename."""
+        errors = {}
+        written = set()
+        with self.flush_lock:
+            with self.lock:
+                self.flushing, self.pending = self.pending, {}
+                self.saves = 0
+            try:
+                for filename, data in self.flushing.items():
+                    try:
+                        save_atomically(filename, data,
+                                        verbose=self.verbose, messager=self.messager)
+                        written.add(filename)
+                    except Exception as error:
+                        errors[filename] = error
+                        _report(f"Could not write ({error})", filename,
+                                True, self.messager)
+            finally:
+                with self.lock:
+                    for filename, data in self.flushing.items():
+                        if filename not in written:
+                            self.pending.setdefault(filename, data)
+                    self.flushing = {}
+        return errors
+
+    def _flush_periodically(self):
+        while not self.stopping.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        """Stop any periodic flushing, and write out all the buffered data.
+        Raise the first error if any of it could not be written."""
+        self.stopping.set()
+        if self.timer:
+            self.timer.join()
+        errors = self.flush()
+        if errors:
+            raise next(iter(errors.values()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# The number of files read or written at once by the asynchronous and
+# bulk functions, unless they are given their own executor.
+IO_WORKERS = 8
+
+_io_executor = None
+_io_executor_lock = threading.Lock()
+
+def io_executor():
+    """Return the shared executor for the asynchronous and bulk functions."""
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=IO_WORKERS)
+        return _io_executor
+
+async def aload(filename, executor=None, **kwargs):
+    """Read a file as for load(), without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(
+        executor or io_executor(),
+        functools.partial(load, filename, **kwargs))
+
+async def asave(filename, data, executor=None, **kwargs):
+    """Write a file as for save(), without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(
+        executor or io_executor(),
+        functools.partial(save, filename, data, **kwargs))
+
+def load_many(filenames, executor=None, **kwargs):
+    """Read several files as for load(), concurrently.
+    Return a dict of their contents, keyed by filename."""
+    filenames = list(filenames)
+    return dict(zip(filenames,
+                    (executor or io_executor()).map(functools.partial(load, **kwargs),
+                                                    filenames)))
+
+def save_many(contents, executor=None, **kwargs):
+    """Write several files as for save(), concurrently, from a dict of
+    contents keyed by filename.  Return a dict of what each writer returned."""
+    return dict(zip(contents.keys(),
+                    (executor or io_executor()).map(functools.partial(save, **kwargs),
+                                                    contents.keys(),
+                                                    contents.values())))
 
 TEMPLATE_PARAM_RE = re.compile("%\\(([a-zA-Z0-9_]+)\\)")
 
+# A whole template field, including its conversion, or a literal '%'.
+TEMPLATE_FIELD_RE = re.compile("%\\(([a-zA-Z0-9_]+)\\)[-#0 +]*[0-9]*(?:\\.[0-9]+)?[a-zA-Z]|%%")
+
+def _template_matcher(template):
+    """Return a compiled pattern matching the filenames a template makes,
+    with a named group for each parameter."""
+    parts = []
+    seen = set()
+    position = 0
+    for field in TEMPLATE_FIELD_RE.finditer(template):
+        parts.append(re.escape(template[position:field.start()]))
+        name = field.group(1)
+        parts.append("%" if name is None
+                     else ("(?P=%s)" % name
+                           if name in seen
+                           else "(?P<%s>[^/]+)" % name))
+        if name:
+            seen.add(name)
+        position = field.end()
+    parts.append(re.escape(template[position:]))
+    return re.compile("".join(parts) + "$")
+
+def _template_formats(template):
+    """Return a dict of each parameter of a template to its own format,
+    such as "%02d" for "%(month)02d"."""
+    return {field.group(1): "%" + field.group(0)[len(field.group(1)) + 3:]
+            for field in TEMPLATE_FIELD_RE.finditer(template)
+            if field.group(1)}
+
+def _formatted(value, formats):
+    """Return the strings a value would appear as in filenames,
+    using any of the given formats that suit it."""
+    strings = {str(value)}
+    for param_format in formats:
+        try:
+            strings.add(param_format % value)
+        except (TypeError, ValueError):
+            pass
+    return strings
+
 class Storage:
 
     """A storage handler class,
@@ -223,17 +1042,29 @@ class Storage:
             self,
             templates,
             defaults,
-            base="."):
+            base=".",
+            cache=None,
+            saver=None):
         self.templates = {}
         self.templates_by_params = {}
+        self.template_matchers = {}
+        self.param_formats = defaultdict(set)
         for name, template in templates.items():
             self.add_template(name, template)
         print(len(self.templates), "templates by name;", len(self.templates_by_params), "by params")
         self.defaults = defaults
         self.base = base
+        self.cache = cache
+        self.saver = saver
+        self.directory_mtimes = {}
+        self.files_by_directory = {}
+        self.files_by_param = defaultdict(lambda: defaultdict(set))
 
     def add_template(self, name, template):
         self.templates[name] = template
+        self.template_matchers[name] = _template_matcher(template)
+        for param, param_format in _template_formats(template).items():
+            self.param_formats[param].add(param_format)
         key = self._key_for_template(template)
         if key in self.templates_by_params:
             print("Warning: template already defined for", key)
@@ -250,6 +1081,76 @@ class Storage:
     def glob(self, pattern, **kwargs):
         return glob.glob(os.path.join(self.resolve(**kwargs), pattern))
 
+    def parse(self, filename):
+        """Return the name of the template that would make a filename
+        relative to the base, and the parameters it would need, or None."""
+        filename = filename.replace(os.sep, "/")
+        for name, matcher in self.template_matchers.items():
+            if (match := matcher.match(filename)):
+                return name, match.groupdict()
+        return None
+
+    def index(self):
+        """Index the files under the base by their template parameters,
+        rescanning only the directories modified since the last index."""
+        base = _expand(self.base)
+        for directory, mtime in list(self.directory_mtimes.items()):
+            try:
+                if os.stat(directory).st_mtime_ns == mtime:
+                    continue
+            except FileNotFoundError:
+                pass
+            self._unindex_directory(directory)
+        if base not in self.directory_mtimes:
+            self._index_directory(base, base)
+        return self
+
+    def _index_directory(self, directory, base):
+        """Index the files in a directory and any new subdirectories."""
+        try:
+            self.directory_mtimes[directory] = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as scanner:
+                entries = list(scanner)
+        except FileNotFoundError:
+            self.directory_mtimes.pop(directory, None)
+            return
+        files = self.files_by_directory[directory] = {}
+        for entry in entries:
+            if entry.is_dir():
+                if entry.path not in self.directory_mtimes:
+                    self._index_directory(entry.path, base)
+            elif (parsed := self.parse(os.path.relpath(entry.path, base))):
+                files[entry.path] = parsed[1]
+                for param, value in parsed[1].items():
+                    self.files_by_param[param][value].add(entry.path)
+
+    def _unindex_directory(self, directory):
+        """Forget a directory's files, and rescan it if it still exists."""
+        for path, params in self.files_by_directory.pop(directory, {}).items():
+            for param, value in params.items():
+                self.files_by_param[param][value].discard(path)
+        del self.directory_mtimes[directory]
+        self._index_directory(directory, _expand(self.base))
+
+    def find(self, **kwargs):
+        """Return a dict of the indexed files whose template parameters
+        include all those given, with the parameters of each file.
+        The given values are formatted as the templates would format
+        them, so month=3 finds files made with "%(month)02d" as "03".
+        The index is built if it has not been already."""
+        if not self.directory_mtimes:
+            self.index()
+        matching = (set.intersection(*(set().union(*(self.files_by_param[param].get(string, set())
+                                                     for string in _formatted(
+                                                             value,
+                                                             self.param_formats[param])))
+                                       for param, value in kwargs.items()))
+                    if kwargs
+                    else set().union(*(files.keys()
+                                       for files in self.files_by_directory.values())))
+        return {path: self.files_by_directory[os.path.dirname(path)][path]
+                for path in sorted(matching)}
+
     def template_for_kwargs(self, kwargs):
         """Choose a template that uses the given parameters."""
         key = self._params_key(kwargs.keys())
@@ -269,8 +1170,8 @@ class Storage:
     def _key_for_template(self, template):
         """Make a key from the parameters used in a template.
         This is used for finding a template to match the given parameters."""
-        return self._params_key([param.group(1)
-                                 for param in TEMPLATE_PARAM_RE.finditer(template)])
+        return self._params_key({param.group(1)
+                                 for param in TEMPLATE_PARAM_RE.finditer(template)})
 
     def open_for_read(self, **kwargs):
         """Return a file handle suitable for reading."""
@@ -281,12 +1182,63 @@ class Storage:
         The directory containing the file will have been created if necessary."""
         return open_for_write(self.resolve(**kwargs))
 
+    def _buffered(self, filename):
+        """Return whether the saver is holding data for a file, and that data."""
+        return self.saver.buffered(filename) if self.saver else (False, None)
+
     def load(self, **kwargs):
-        return load(self.resolve(**kwargs))
+        """Load the file for the given parameters, or the data waiting
+        in the saver to be written to it."""
+        filename = self.resolve(**kwargs)
+        found, data = self._buffered(filename)
+        return data if found else load(filename, cache=self.cache)
 
     def save(self, data, **kwargs):
-        return save(self.resolve(**kwargs),
-                    data)
+        """Save the file for the given parameters, through the saver if there is one."""
+        return (self.saver.save if self.saver else save)(self.resolve(**kwargs),
+                                                          data)
+
+    async def aload(self, **kwargs):
+        """Load the file for the given parameters, without blocking the event loop."""
+        filename = self.resolve(**kwargs)
+        found, data = self._buffered(filename)
+        return data if found else await aload(filename, cache=self.cache)
+
+    async def asave(self, data, **kwargs):
+        """Save the file for the given parameters, without blocking the event loop."""
+        if self.saver:
+            return self.saver.save(self.resolve(**kwargs), data)
+        return await asave(self.resolve(**kwargs), data)
+
+    def load_many(self, params_list, executor=None):
+        """Load the files for each of a list of parameter dicts, concurrently.
+        Return a dict of their contents, keyed by the parameters as frozendicts."""
+        filenames = {frozendict(params): self.resolve(**params) for params in params_list}
+        results = {}
+        unbuffered = {}
+        for params, filename in filenames.items():
+            found, data = self._buffered(filename)
+            if found:
+                results[params] = data
+            else:
+                unbuffered[params] = filename
+        loaded = load_many(unbuffered.values(), executor=executor, cache=self.cache)
+        results.update({params: loaded[filename]
+                        for params, filename in unbuffered.items()})
+        return {params: results[params] for params in filenames}
+
+    def save_many(self, data_and_params, executor=None):
+        """Save each of a list of (data, parameter dict) pairs, concurrently.
+        Return a dict of what each writer returned, keyed by the
+        parameters as frozendicts."""
+        pairs = [(frozendict(params), data) for data, params in data_and_params]
+        if self.saver:
+            return {params: self.saver.save(self.resolve(**params), data)
+                    for params, data in pairs}
+        return dict(zip((params for params, _ in pairs),
+                        save_many({self.resolve(**params): data
+                                   for params, data in pairs},
+                                  executor=executor).values()))
 
 class UsingFiles(Storage):
 
@@ -312,16 +1264,117 @@ def function_cached_with_file(function, filename):
             if os.path.exists(filename)
             else save(filename, function()))
 
+# Directories with at least this many files being looked up at once
+# are scanned as a whole, rather than looking at each file separately.
+SCAN_THRESHOLD = 8
+
+class StatCache:
+
+    """A cache of the os.stat results for files.
+
+    Results are kept for ttl seconds, and for the whole of any 'with
+    stat_cache.run():' block, so that a batch of operations looks at
+    each file only once.  Files written by save() are dropped from
+    the cache."""
+
+    def __init__(self, ttl=0):
+        self.ttl = ttl
+        self.entries = {}
+        self.depth = 0
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def run(self):
+        """Keep all results until the end of the block."""
+        with self.lock:
+            self.depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.depth -= 1
+                if not self.depth and not self.ttl:
+                    self.entries.clear()
+
+    def _keeping(self):
+        return self.depth or self.ttl
+
+    def _cached(self, full_name, now):
+        """Return the cached entry for a file, or None if it has none or it has expired."""
+        entry = self.entries.get(full_name)
+        if entry and (self.depth or now - entry[0] < self.ttl):
+            return entry
+        return None
+
+    def stats(self, filenames):
+        """Return a dict of filenames to their stat results, or None for missing files."""
+        now = time.monotonic()
+        result = {}
+        wanted = defaultdict(dict)
+        for filename in filenames:
+            full_name = _expand(filename)
+            if (entry := self._cached(full_name, now)):
+                result[filename] = entry[1]
+            else:
+                directory, basename = os.path.split(full_name)
+                wanted[directory][basename] = filename
+        for directory, names in wanted.items():
+            found = {}
+            if len(names) >= SCAN_THRESHOLD:
+                try:
+                    with os.scandir(directory or ".") as scanner:
+                        for entry in scanner:
+                            if entry.name in names:
+                                try:
+                                    found[entry.name] = entry.stat()
+                                except FileNotFoundError:
+                                    # A dangling symbolic link.
+                                    pass
+                except FileNotFoundError:
+                    pass
+            else:
+                for basename in names:
+                    try:
+                        found[basename] = os.stat(os.path.join(directory, basename))
+                    except FileNotFoundError:
+                        pass
+            for basename, filename in names.items():
+                result[filename] = found.get(basename)
+                if self._keeping():
+                    self.entries[os.path.join(directory, basename)] = (now, result[filename])
+        return result
+
+    def stat(self, filename):
+        """Return the stat result for a file, raising FileNotFoundError if it is missing."""
+        result = self.stats([filename])[filename]
+        if result is None:
+            raise FileNotFoundError(filename)
+        return result
+
+    def mtimes(self, filenames):
+        """Return a dict of filenames to their modification times, or 0 for missing files."""
+        return {filename: (result.st_mtime if result else 0)
+                for filename, result in self.stats(filenames).items()}
+
+    def invalidate(self, filename=None):
+        """Forget the result for a file, or for all files."""
+        if filename is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(_expand(filename), None)
+
+# The cache used by the modification time functions.
+stat_cache = StatCache()
+
 def modified(filename):
     """Return the modification time of a file.
     If the file does not exist, the epoch is returned."""
     if filename is None:
         return 0
-    fname = _expand(filename)
-    return os.path.getmtime(fname) if os.path.exists(fname) else 0
+    return stat_cache.mtimes([filename])[filename]
 
 def file_newer_than_file(a, b):
-    return os.path.getmtime(_expand(a)) > os.path.getmtime(_expand(b))
+    return stat_cache.stat(a).st_mtime > stat_cache.stat(b).st_mtime
 
 def in_modification_order(filenames):
     """"Return a list of filenames sorted into modification order.
@@ -329,13 +1382,113 @@ def in_modification_order(filenames):
     apply shell-style globbing to convert it to a list."""
     if isinstance(filenames, str):
         filenames = glob.glob(_expand(filenames))
-    return sorted(filenames, key=modified)
+    else:
+        filenames = list(filenames)
+    return sorted(filenames, key=stat_cache.mtimes(filenames).get)
 
 def most_recently_modified(filenames):
     """Return the most recently modified of a list of files."""
     names = in_modification_order(filenames)
     return names[-1] if names else None
 
+def _load_converted(origin, converter):
+    """Read a file, converting each entry, and dropping those that convert to None."""
+    return [entry
+            for raw in load(origin, lazy=True)
+            if (entry := converter(raw)) is not None]
+
+POOLS = {
+    "thread": concurrent.futures.ThreadPoolExecutor,
+    "process": concurrent.futures.ProcessPoolExecutor,
+    }
+
+def _load_origins(origins, max_workers, pool, verbose, messager):
+    """Read and convert each of the origins for combined(), in order."""
+    if max_workers == 1:
+        return [[entry
+                 for raw in load(origin,
+                                 verbose=verbose,
+                                 messager=messager,
+                                 lazy=True)
+                 if (entry := converter(raw)) is not None]
+                for origin, converter in origins.items()]
+    # Report from this thread only, so that the messages from
+    # concurrently loading origins do not get mixed up.
+    for origin in origins:
+        _report("Reading", origin, verbose, messager)
+    with POOLS[pool](max_workers=max_workers) as executor:
+        return list(executor.map(_load_converted, origins.keys(), origins.values()))
+
+def _file_digest(filename):
+    """Return a hash of the contents of a file."""
+    digest = hashlib.sha256()
+    with open(_expand(filename), 'rb') as instream:
+        while block := instream.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _read_manifest(manifest_file):
+    """Read a combined() manifest, returning an empty one if it is missing or unreadable."""
+    try:
+        with open(_expand(manifest_file), 'rb') as instream:
+            return pickle.load(instream)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+
+def _write_manifest(manifest_file, manifest):
+    """Write a combined() manifest, replacing any previous one in one step."""
+    full_name = _expand(manifest_file)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(full_name) or ".",
+                                     delete=False) as outstream:
+        pickle.dump(manifest, outstream)
+    os.replace(outstream.name, full_name)
+
+def _load_origins_incrementally(origins, manifest, max_workers, pool, verbose, messager):
+    """Read and convert the origins for combined(), reusing the converted
+    rows recorded in the manifest for origins that have not changed.
+    Return the lists of rows, and the updated manifest."""
+    updated = {}
+    stale = {}
+    for origin, converter in origins.items():
+        stat = stat_cache.stats([origin])[origin]
+        if stat is None:
+            stale[origin] = converter
+            continue
+        entry = {'mtime': stat.st_mtime, 'size': stat.st_size}
+        previous = manifest.get(origin)
+        if previous and (previous['mtime'], previous['size']) == (entry['mtime'], entry['size']):
+            updated[origin] = previous
+            continue
+        entry['hash'] = _file_digest(origin)
+        if previous and previous['hash'] == entry['hash']:
+            entry['rows'] = previous['rows']
+        else:
+            stale[origin] = converter
+        updated[origin] = entry
+    for origin, rows in zip(stale, _load_origins(stale, max_workers, pool,
+                                                 verbose, messager)):
+        if origin in updated:
+            updated[origin]['rows'] = rows
+        else:
+            updated[origin] = {'mtime': 0, 'size': 0, 'hash': None, 'rows': rows}
+    return [updated[origin]['rows'] for origin in origins], updated
+
+def _new_rows(origins, previous, updated):
+    """Return the lists of rows added to each origin since the previous
+    manifest, or None if there was no previous manifest, or it does not
+    list the same origins, or any origin has changed other than by
+    adding rows."""
+    if not previous or set(previous) != set(origins):
+        return None
+    new_rows = []
+    for origin in origins:
+        old = previous[origin]['rows']
+        current = updated[origin]['rows']
+        if current[:len(old)] != old:
+            return None
+        new_rows.append(current[len(old):])
+    return new_rows
+
 def combined(
         destination,
         combiner,
@@ -343,6 +1496,10 @@ def combined(
         reloader=lambda x: x,
         verbose=False,
         messager=None,
+        max_workers=1,
+        pool="thread",
+        manifest=None,
+        append=False,
 ):
     """If any of the origin files have been updated since the destination
     was, run the combiner function on their contents and write its
@@ -351,48 +1508,241 @@ def combined(
     The 'combiner' argument is a function taking a list of lists,
     typically, the result of reading multiple CSV files, and its
     result would typically be a list to be written to a CSV file.
+    If the combiner returns a generator, it is written out as it runs,
+    rather than being held in memory, and the number of rows written
+    is returned.
 
     The 'origins' argument is a dictionary binding filename strings to
     row processing functions, so this function can be used to
     transform incoming data and merge it into a collection.  If a row
     processing function returns `None`, the row is skipped.
 
+    If max_workers is not 1, the origins are read and converted
+    concurrently, using a pool of that many workers (or the default
+    number, if it is None) of the kind named by 'pool', which is
+    "thread" or "process".  For a process pool, the row processing
+    functions must be picklable.  The lists passed to the combiner are
+    in the same order as the origins either way.
+
+    If a 'manifest' filename is given (or True, for the destination
+    filename with ".manifest" added), the modification time, size, and
+    content hash of each origin, and its converted rows, are kept in
+    that file, and only the origins that have changed since the last
+    run are read and converted again.  The manifest does not notice
+    changes to the row processing functions, so remove it if they
+    change.
+
+    If append is also true, and the destination is of a type that can
+    be appended to (see APPENDERS), such as JSON Lines, the combiner
+    is run only on the rows that are new since the last run, and its
+    result is added to the end of the destination and returned.  This
+    happens only if the manifest from the last run lists the same
+    origins, and they have only gained rows at their ends; otherwise
+    the destination is rewritten as usual.
+
     Otherwise, read and return the destination file, applying the
     'reloader' argument to each entry in it.
     """
-    return (save(destination,
-                 combiner([[entry
-                            for raw in load(origin,
-                                            verbose=verbose,
-                                            messager=messager)
-                            if (entry := converter(raw)) is not None]
-                           for origin, converter in origins.items()]),
-                 verbose=verbose,
-                 messager=messager)
-            if (modified(destination)
-                <= modified(most_recently_modified(origins)))
-            else [reload_entry
-                  for reload_raw in load(destination,
-                                         verbose=verbose,
-                                         messager=messager)
-                  if (reload_entry := reloader(reload_raw))])
+    with stat_cache.run():
+        stat_cache.stats([destination, *origins])
+        if modified(destination) > modified(most_recently_modified(origins)):
+            return [reload_entry
+                    for reload_raw in load(destination,
+                                           verbose=verbose,
+                                           messager=messager)
+                    if (reload_entry := reloader(reload_raw))]
+        if not manifest:
+            return save(destination,
+                        combiner(_load_origins(origins, max_workers, pool,
+                                               verbose, messager)),
+                        verbose=verbose,
+                        messager=messager)
+        if manifest is True:
+            manifest = destination + ".manifest"
+        previous = _read_manifest(manifest)
+        rows, updated = _load_origins_incrementally(origins, previous,
+                                                    max_workers, pool,
+                                                    verbose, messager)
+        if (append
+            and (appender := APPENDERS.get(format_extension(destination)))
+            and os.path.exists(_expand(destination))
+            and (new_rows := _new_rows(origins, previous, updated)) is not None):
+            _report("Appending to", destination, verbose, messager)
+            result = appender(destination, combiner(new_rows))
+            _write_manifest(manifest, updated)
+            return result
+        result = save(destination,
+                      combiner(rows),
+                      verbose=verbose,
+                      messager=messager)
+        _write_manifest(manifest, updated)
+        return result
+
+def _count_lines(filename):
+    """Return the number of lines in a file."""
+    count = 0
+    with open(filename, 'rb') as instream:
+        while block := instream.read(1 << 20):
+            count += block.count(b'\n')
+    return count
+
+# The Linux ioctl for sharing a file's blocks with another file.
+FICLONE = 0x40049409
+
+def _reflink(source, destination):
+    """Try to make destination share source's blocks, returning whether it worked."""
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+        return True
+    except OSError:
+        return False
+
+def _copy_contents(source, destination):
+    """Copy one open file to another, in the kernel if possible."""
+    if hasattr(os, 'copy_file_range'):
+        remaining = os.fstat(source.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(source.fileno(), destination.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+            return
+        except OSError:
+            source.seek(0)
+            destination.seek(0)
+            destination.truncate()
+    shutil.copyfileobj(source, destination)
+
+def _snapshot(filename, link=False):
+    """Copy a file to a hidden file beside it as cheaply as possible,
+    returning the name of the copy.
+
+    If link is true, the copy is a hard link, which is only safe if
+    the file will be replaced by renaming rather than rewritten."""
+    directory, basename = os.path.split(filename)
+    handle, snapshot = tempfile.mkstemp(dir=directory or ".",
+                                        prefix="." + basename + ".",
+                                        suffix=".snapshot")
+    os.close(handle)
+    try:
+        if link:
+            os.remove(snapshot)
+            os.link(filename, snapshot)
+        else:
+            with open(filename, 'rb') as source, open(snapshot, 'wb') as destination:
+                if not _reflink(source, destination):
+                    _copy_contents(source, destination)
+            # mkstemp makes the snapshot private, and restoring renames
+            # it over the original, so give it the original's permissions.
+            shutil.copymode(filename, snapshot)
+    except BaseException:
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+        raise
+    return snapshot
 
 class FileProtection:
 
     """Check how a file size has changed in this context.
 
-    If it has reduced too much, restore the original contents."""
+    If it has reduced too much, restore the original contents.
 
-    def __init__(self, filename, max_reduction=0.1):
-        self.filename = filename
+    The original contents are kept in a snapshot file beside the
+    original, made by reflinking or copying in the kernel where
+    possible (or by hard-linking, if link is true, which is only safe
+    if the file will be replaced by renaming rather than rewritten),
+    and put back by renaming it.  If the snapshot cannot be made, the
+    contents are kept in memory instead.
+
+    If check_rows is true, the number of lines is checked as well as
+    the size."""
+
+    def __init__(self, filename, max_reduction=0.1, check_rows=False, link=False):
+        self.filename = _expand(filename)
         self.max_reduction = max_reduction
+        self.check_rows = check_rows
+        self.link = link
         self.data = None
+        self.snapshot = None
+        self.size = None
+        self.rows = None
 
     def __enter__(self):
-        with open(self.filename, 'rb') as original:
-            self.data = original.read()
+        if not os.path.exists(self.filename):
+            return self
+        self.size = os.stat(self.filename).st_size
+        if self.check_rows:
+            self.rows = _count_lines(self.filename)
+        try:
+            self.snapshot = _snapshot(self.filename, self.link)
+        except OSError:
+            with open(self.filename, 'rb') as original:
+                self.data = original.read()
+        return self
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        if os.stat(self.filename).st_size < (len(self.data) * self.max_reduction):
+    def shrunk(self):
+        """Return whether the file has reduced too much."""
+        if self.size is None:
+            return False
+        if not os.path.exists(self.filename):
+            return True
+        return (os.stat(self.filename).st_size < (self.size * self.max_reduction)
+                or (self.check_rows
+                    and _count_lines(self.filename) < (self.rows * self.max_reduction)))
+
+    def restore(self):
+        """Put back the original contents of the file."""
+        if self.snapshot:
+            os.replace(self.snapshot, self.filename)
+            self.snapshot = None
+        elif self.data is not None:
             with open(self.filename, 'wb') as restoration:
                 restoration.write(self.data)
+
+    def discard(self):
+        """Drop the copy of the original contents."""
+        if self.snapshot and os.path.exists(self.snapshot):
+            os.remove(self.snapshot)
+        self.snapshot = None
+        self.data = None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.shrunk():
+            self.restore()
+        self.discard()
+
+class FilesProtection:
+
+    """Check how the sizes of a group of files have changed in this context,
+    such as the destination and manifest of a combined() call.
+
+    If any of them has reduced too much, restore the original contents
+    of all of them.  The arguments are as for FileProtection."""
+
+    def __init__(self, filenames, max_reduction=0.1, check_rows=False, link=False):
+        self.protections = [FileProtection(filename,
+                                           max_reduction=max_reduction,
+                                           check_rows=check_rows,
+                                           link=link)
+                            for filename in filenames]
+
+    def __enter__(self):
+        entered = []
+        try:
+            for protection in self.protections:
+                entered.append(protection.__enter__())
+        except BaseException:
+            for protection in entered:
+                protection.discard()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if any(protection.shrunk() for protection in self.protections):
+            for protection in self.protections:
+                protection.restore()
+        for protection in self.protections:
+            protection.discard()
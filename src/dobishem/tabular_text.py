@@ -1,6 +1,13 @@
 # Read and write org-mode style tables
 
+import contextlib
+import io
+import locale
+import mmap
+import os
+import pickle
 import re
+import tempfile
 
 DIVIDER = re.compile(r"^ *\|[-+]+\| *$")
 
@@ -27,26 +34,155 @@ def read_tabular_to_dicts(source):
     return ({k: v for k, v in dict(zip(header, row)).items() if v}
             for row in rows), header
 
+def _column_spans(line, separators):
+    """Return the (start, end) positions of the cells in a header or divider line."""
+    positions = [i for i, char in enumerate(line.rstrip()) if char in separators]
+    return list(zip([position + 1 for position in positions], positions[1:]))
+
+def read_tabular_fast(source, converters=None):
+    """Read a tabular text to dicts of cells, as for read_tabular_to_dicts.
+
+    The column boundaries are found once, from the first divider line
+    or failing that from the header line, and each row is sliced at
+    those positions.  Rows whose separators are not where the
+    header's are, such as in hand-edited tables that org-mode has not
+    realigned yet, are split on the separators instead.
+
+    If converters are given, as a dict of column names to functions,
+    each non-empty cell in those columns is converted by the function.
+    """
+    converters = converters or {}
+    lines = iter(source)
+    divider = None
+    for line in lines:
+        if not line.strip():
+            continue
+        if is_divider(line):
+            divider = line
+            continue
+        header_line = line
+        break
+    else:
+        return iter(()), []
+    spans = (_column_spans(divider, "|+")
+             if divider
+             else _column_spans(header_line, "|"))
+    header = [header_line[start:end].strip() for start, end in spans]
+    if header != cells(header_line):
+        # The divider does not match the header, so fall back to splitting.
+        spans = _column_spans(header_line, "|")
+        header = cells(header_line)
+    first = spans[0][0] - 1 if spans else 0
+    last = spans[-1][1] if spans else 0
+    ends = [end for _start, end in spans]
+    column_converters = [(name, converters.get(name)) for name in header]
+
+    def rows():
+        for line in lines:
+            if (len(line) > last
+                and line[first] == '|'
+                and all(line[end] == '|' for end in ends)):
+                if line[first + 1] == '-':
+                    continue
+                values = [line[start:end].strip() for start, end in spans]
+            elif is_layout(line.strip()):
+                continue
+            else:
+                values = cells(line)
+            yield {name: (converter(value) if converter else value)
+                   for (name, converter), value in zip(column_converters, values)
+                   if value}
+
+    return rows(), header
+
+def mapped_lines(filename, encoding=None):
+    """Yield the lines of a file, reading it through a memory map.
+    As for a file opened in text mode, the encoding defaults to the
+    locale's, and "\r\n" line endings are read as "\n"."""
+    encoding = encoding or locale.getpreferredencoding(False)
+    with open(filename, 'rb') as instream:
+        if os.fstat(instream.fileno()).st_size == 0:
+            return
+        with mmap.mmap(instream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line in iter(mapped.readline, b""):
+                if line.endswith(b"\r\n"):
+                    line = line[:-2] + b"\n"
+                yield line.decode(encoding)
+
+def column_widths(data, column_order=[]):
+    """Return the widths needed for the columns of a list of dicts,
+    without keeping the cells as strings."""
+    widths = {name: len(name) for name in column_order}
+    for row in data:
+        for name, cell in row.items():
+            widths[name] = max(widths.get(name, len(name)), len(str(cell)))
+    return widths
+
+def _spilled(rows, spill):
+    """Yield rows, pickling each one into a spill file as it goes past."""
+    for row in rows:
+        pickle.dump(row, spill)
+        yield row
+
+def _unspilled(spill):
+    """Yield the rows pickled into a spill file."""
+    spill.seek(0)
+    while True:
+        try:
+            yield pickle.load(spill)
+        except EOFError:
+            return
+
+def write_tabular(stream, data, column_order=[], widths=None):
+    """Write tabular data to a stream, a line at a time.
+
+    If the widths of the columns are not given, they are found in a
+    first pass over the data; if the data is an iterator, the rows are
+    spilled to a temporary file in that pass, and written from there.
+
+    Given widths only size the columns; a cell wider than its column's
+    width is written whole, which breaks the alignment of that row.
+    The columns are still found from the data, unless it is an
+    iterator, when they are those in column_order and widths, and a
+    row with any other column raises ValueError.
+
+    Returns the data, or, if it is an iterator, the number of rows written."""
+    is_iterator = iter(data) is data
+    with (tempfile.TemporaryFile()
+          if is_iterator and widths is None
+          else contextlib.nullcontext()) as spill:
+        rows = data
+        if widths is None:
+            if is_iterator:
+                widths = column_widths(_spilled(data, spill), column_order)
+                rows = _unspilled(spill)
+            else:
+                widths = column_widths(data, column_order)
+        elif not is_iterator:
+            widths = column_widths(data, column_order) | widths
+        all_columns = column_order + sorted(set(widths.keys()) - set(column_order))
+        known_columns = set(all_columns)
+        formats = [(colname, "%%-%ds" % widths.get(colname, len(colname)))
+                   for colname in all_columns]
+        hline = "|-" + "-+-".join("-" * (widths.get(colname, len(colname)))
+                                  for colname in all_columns) + "-|\n"
+        stream.write(hline)
+        stream.write("| " + " | ".join([colformat % colname
+                                        for colname, colformat in formats]) + " |\n")
+        stream.write(hline)
+        count = 0
+        for row in rows:
+            if not known_columns.issuperset(row.keys()):
+                raise ValueError("Row has columns not given in widths or column_order: %s"
+                                 % sorted(set(row.keys()) - known_columns))
+            stream.write("| " + " | ".join([colformat % str(row.get(colname, ""))
+                                            for colname, colformat in formats]) + " |\n")
+            count += 1
+        stream.write(hline)
+    return count if is_iterator else data
+
 def dicts_to_tabular_string(data, column_order=[]):
     """Convert a list of dicts to a tabular string."""
-    as_strings = [{name: str(cell) for name, cell in row.items()} for row in data]
-    all_columns = column_order + sorted(set().union(*[set(record.keys())
-                                                      for record in as_strings])
-                                        - set(column_order))
-    widths = {name: max(len(name),
-                        max(len(row.get(name, "")) for row in as_strings))
-              for name in all_columns}
-    hline = "|-" + "-+-".join("-" * widths[colname] for colname in all_columns) + "-|"
-    formats = {colname: "%%-%ds" % colwidth
-               for colname, colwidth in widths.items()}
-    return "\n".join([hline,
-                      "| " + " | ".join([formats[colname] % colname for colname in all_columns]) + " |",
-                      hline]
-                     + ["| " + " | ".join([formats[colname] % row.get(colname, "") for colname in all_columns]) + " |"
-                        for row in as_strings]
-                     + [hline])
-
-def write_tabular(stream, data, column_order=[]):
-    """Write tabular data to a stream."""
-    stream.write(dicts_to_tabular_string(data, column_order))
-    return data
+    output = io.StringIO()
+    write_tabular(output, data, column_order)
+    return output.getvalue()
@@ -0,0 +1,14 @@
+import dobishem.benchmarks
+
+def test_ledger_rows():
+    rows = list(dobishem.benchmarks.ledger_rows(100))
+    assert len(rows) == 100
+    assert rows == sorted(rows, key=lambda row: row['Date'])
+
+def test_benchmarks(tmp_path):
+    results = dobishem.benchmarks.run_benchmarks([50], directory=tmp_path)
+    assert ([result['benchmark'] for result in results]
+            == list(dobishem.benchmarks.BENCHMARKS))
+    assert all(result['peak_memory_bytes'] > 0 for result in results)
+    ratios = dobishem.benchmarks.compare(results, results)
+    assert set(ratios.values()) == {1.0}
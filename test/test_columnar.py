@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+import dobishem.columnar
+import dobishem.storage
+
+REFERENCE = [ {'Date': "2023-12-09", 'Item': "akullore", 'Price': "1.00"},
+              {'Date': "2023-12-09", 'Item': "buke", 'Price': "2.20"},
+              {'Date': "2023-12-10", 'Item': "spinaq", 'Price': ".50"},
+             ]
+
+@pytest.fixture(params=["numpy", "fallback"])
+def columns(request, monkeypatch):
+    """Run a test with NumPy, if it is installed, and without it."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(dobishem.columnar, "numpy", None)
+    return request.param
+
+def test_from_rows(columns):
+    table = dobishem.columnar.ColumnTable.from_rows(REFERENCE + [{'Item': "kos", 'Shop': "Conad"}])
+    assert len(table) == 4
+    assert table.column_names() == ['Date', 'Item', 'Price', 'Shop']
+    assert table.rows()[:3] == [row | {'Shop': ""} for row in REFERENCE]
+    assert table.rows()[3] == {'Date': "", 'Item': "kos", 'Price': "", 'Shop': "Conad"}
+
+def test_mixed_columns(columns):
+    rows = [{'Item': "akullore", 'Count': 1},
+            {'Item': "buke"},
+            {'Item': "kos", 'Count': 2.5}]
+    table = dobishem.columnar.ColumnTable.from_rows(rows)
+    assert table.rows() == [rows[0], rows[1] | {'Count': ""}, rows[2]]
+    assert table.matches('Count', 1).rows() == [rows[0]]
+    if columns == "numpy":
+        assert table['Count'].dtype == object
+        assert table['Item'].dtype.kind == 'U'
+
+def test_matches_and_renames(columns):
+    table = dobishem.columnar.ColumnTable.from_rows(REFERENCE)
+    assert table.matches('Date', "2023-12-09").rows() == REFERENCE[:2]
+    assert table.matches(None, None).rows() == REFERENCE
+    assert table.matches('Shop', "Conad").rows() == []
+    assert (table.rename_columns({'Item': "Artikull"}).rows()[0]
+            == {'Date': "2023-12-09", 'Artikull': "akullore", 'Price': "1.00"})
+
+def test_read_columnar(tmp_path, columns):
+    for extension in ["csv", "table"]:
+        filename = os.path.join(tmp_path, "foo." + extension)
+        dobishem.storage.save(filename, REFERENCE)
+        table = dobishem.storage.load(filename, columnar=True)
+        assert sorted(table.rows(), key=lambda row: row['Item']) == REFERENCE
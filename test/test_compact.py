@@ -0,0 +1,62 @@
+import os
+import pickle
+
+from frozendict import frozendict
+
+import dobishem.compact
+import dobishem.storage
+
+REFERENCE = [ {'Date': "2023-12-09", 'Item': "akullore", 'Price': "1.00"},
+              {'Date': "2023-12-09", 'Item': "buke", 'Price': "2.20"},
+              {'Date': "2023-12-10", 'Item': "spinaq", 'Price': ".50"},
+             ]
+
+def test_compact_row():
+    row_class = dobishem.compact.row_class(('Date', 'Item', 'Price'))
+    assert dobishem.compact.row_class(('Date', 'Item', 'Price')) is row_class
+    rows = [row_class.from_dict(row) for row in REFERENCE]
+    assert rows == REFERENCE
+    assert rows[0]['Item'] == "akullore"
+    assert rows[0].get('Shop', "none") == "none"
+    assert dict(rows[1]) == REFERENCE[1]
+    assert rows[0]['Date'] is rows[1]['Date']
+    assert len({rows[0], row_class.make(["2023-12-09", "akullore", "1.00"])}) == 1
+    assert pickle.loads(pickle.dumps(rows[2])) == rows[2]
+
+def test_read_compact(tmp_path):
+    filename = os.path.join(tmp_path, "compact.csv")
+    dobishem.storage.default_write_csv(filename, REFERENCE)
+    rows = dobishem.storage.read_csv(filename, row_type=dobishem.compact.CompactRow)
+    assert rows == REFERENCE
+    assert all(isinstance(row, dobishem.compact.CompactRow) for row in rows)
+    by_date = dobishem.storage.read_csv(filename,
+                                        row_type=dobishem.compact.CompactRow,
+                                        result_type=set,
+                                        key_column='Date')
+    assert ({date: {frozendict(row.to_dict()) for row in rows}
+             for date, rows in by_date.items()}
+            == dobishem.storage.read_csv(filename, result_type=set, key_column='Date'))
+    assert (dobishem.storage.read_csv_parallel(filename,
+                                               row_type=dobishem.compact.CompactRow,
+                                               min_chunk_size=50)
+            == REFERENCE)
+
+def test_compact_roundtrip(tmp_path):
+    filename = os.path.join(tmp_path, "original.csv")
+    copy = os.path.join(tmp_path, "copy.csv")
+    dobishem.storage.default_write_csv(filename, REFERENCE)
+    rows = dobishem.storage.read_csv(filename, row_type=dobishem.compact.CompactRow)
+    assert tuple(rows[0]) == ("2023-12-09", "akullore", "1.00")
+    dobishem.storage.save(copy, rows)
+    assert dobishem.storage.load(copy) == REFERENCE
+    dobishem.storage.save(copy, iter(rows))
+    assert dobishem.storage.load(copy) == REFERENCE
+
+def test_compact_ragged_rows():
+    row_class = dobishem.compact.row_class(('A', 'B', 'C'))
+    short = row_class.make(["1", "2"])
+    assert short.get('C') is None
+    assert short == {'A': "1", 'B': "2", 'C': None}
+    long = row_class.make(["1", "2", "3", "4", "5"])
+    assert long['C'] == "3"
+    assert long[None] == ("4", "5")
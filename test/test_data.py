@@ -0,0 +1,78 @@
+import os
+
+import dobishem.compact
+import dobishem.data
+import dobishem.storage
+
+REFERENCE = [ {'Date': "2023-12-09", 'Item': "akullore", 'Price': "1.00"},
+              {'Date': "2023-12-09", 'Item': "buke", 'Price': "2.20"},
+              {'Date': "2023-12-10", 'Item': "spinaq", 'Price': ".50"},
+             ]
+
+def test_transform_cells():
+    assert (dobishem.data.transform_cells(REFERENCE[0], {'Price': float})
+            == REFERENCE[0] | {'Price': 1.0})
+
+def test_row_pipeline(tmp_path):
+    pipeline = (dobishem.data.RowPipeline()
+                .rename({'Price': "Amount"})
+                .transform({'Amount': float})
+                .filter('Date', "2023-12-09")
+                .derive('Double', lambda row: row['Amount'] * 2)
+                .where(lambda row: row['Double'] > 3))
+    expected = [{'Date': "2023-12-09", 'Item': "buke", 'Amount': 2.2, 'Double': 4.4}]
+    assert [row for row in map(pipeline, REFERENCE) if row] == expected
+    filename = os.path.join(tmp_path, "pipeline.csv")
+    dobishem.storage.default_write_csv(filename, REFERENCE)
+    assert dobishem.storage.read_csv(filename, transform_row=pipeline) == expected
+    assert [row
+            for row in map(dobishem.data.RowPipeline(['Date', 'Item', 'Price'])
+                           .filter('Shop', "Conad"),
+                           REFERENCE)
+            if row] == []
+
+SHOPS = [{'Item': "akullore", 'Shop': "Conad"},
+         {'Item': "buke", 'Shop': "Furra"},
+         {'Item': "kos", 'Shop': "Conad"},
+         {'Item': "kos", 'Shop': "Spar"}]
+
+def test_joins(tmp_path):
+    expected_inner = [REFERENCE[0] | SHOPS[0], REFERENCE[1] | SHOPS[1]]
+    assert list(dobishem.data.hash_join(REFERENCE, SHOPS, 'Item')) == expected_inner
+    assert (sorted(dobishem.data.hash_join(REFERENCE, SHOPS[:2] * 2, 'Item', how='left'),
+                   key=lambda row: row['Item'])
+            == sorted(expected_inner * 2 + [REFERENCE[2]], key=lambda row: row['Item']))
+    assert (list(dobishem.data.hash_join(iter(REFERENCE), SHOPS, 'Item', how='left'))
+            == expected_inner + [REFERENCE[2]])
+    by_item = sorted(REFERENCE, key=lambda row: row['Item'])
+    assert (list(dobishem.data.merge_join(by_item, SHOPS, 'Item', how='left'))
+            == expected_inner + [REFERENCE[2]])
+    filename = os.path.join(tmp_path, "keyed.csv")
+    dobishem.storage.default_write_csv(filename, SHOPS[:2])
+    lookup = dobishem.storage.read_csv(filename, result_type=dict, key_column='Item')
+    assert list(dobishem.data.hash_join(REFERENCE, lookup, 'Item')) == expected_inner
+    compact_row = dobishem.compact.row_class(tuple(REFERENCE[0]))
+    compact = [compact_row.from_dict(row) for row in REFERENCE]
+    assert (list(dobishem.data.hash_join(compact, SHOPS, 'Item', how='left'))
+            == expected_inner + [REFERENCE[2]])
+    assert (list(dobishem.data.merge_join(sorted(compact, key=lambda row: row['Item']),
+                                          SHOPS, 'Item'))
+            == expected_inner)
+
+def test_group_by():
+    aggregations = {'Total': ('sum', 'Price', float),
+                    'Entries': ('count', 'Item'),
+                    'First': ('first', 'Item'),
+                    'Last': ('last', 'Item'),
+                    'Cheapest': ('min', 'Price', float),
+                    'Dearest': ('max', 'Price', float)}
+    expected = [{'Date': "2023-12-09", 'Total': 3.2, 'Entries': 2, 'First': "akullore",
+                 'Last': "buke", 'Cheapest': 1.0, 'Dearest': 2.2},
+                {'Date': "2023-12-10", 'Total': 0.5, 'Entries': 1, 'First': "spinaq",
+                 'Last': "spinaq", 'Cheapest': 0.5, 'Dearest': 0.5}]
+    assert list(dobishem.data.group_by(iter(REFERENCE), 'Date', aggregations)) == expected
+    assert list(dobishem.data.group_by(REFERENCE, 'Date', aggregations,
+                                       presorted=True)) == expected
+    assert (list(dobishem.data.group_by(REFERENCE, lambda row: row['Date'][:7],
+                                        {'Entries': ('count', 'Item')}))
+            == [{'Key': "2023-12", 'Entries': 3}])
@@ -0,0 +1,55 @@
+import datetime
+import os
+import pytest
+
+import dobishem.compact
+import dobishem.dates
+import dobishem.storage
+
+ENTRIES = [{'Date': "2023-12-%02d" % day, 'Item': "artikull %d" % i}
+           for i, day in enumerate((31, 5, 9, 9, 20))] + [{'Date': "2024-01-02", 'Item': "viti i ri"}]
+
+def test_date_index(tmp_path):
+    filename = os.path.join(tmp_path, "ledger.csv")
+    dobishem.storage.save(filename, ENTRIES)
+    index = dobishem.dates.DateIndex(dobishem.storage.default_read_csv(filename))
+    assert (sorted(row['Item'] for row in index.between("2023-12-09", "2023-12-31"))
+            == sorted(row['Item']
+                      for row in dobishem.dates.entries_between_dates(ENTRIES,
+                                                                      "2023-12-09",
+                                                                      "2023-12-31")))
+    assert [row['Date'] for row in index.before("2023-12-09")] == ["2023-12-05"]
+    assert [row['Date'] for row in index.after("2023-12-31")] == ["2024-01-02"]
+    assert {month: len(rows) for month, rows in index.by_month().items()} == {(2023, 12): 5,
+                                                                              (2024, 1): 1}
+    assert list(index.by_year()) == [2023, 2024]
+    keyed = dobishem.storage.read_csv(filename, result_type=set, key_column='Date')
+    assert len(dobishem.dates.DateIndex(keyed).between("2023-12-09", "2023-12-09")) == 2
+
+def test_normalize_date():
+    assert dobishem.dates.normalize_date("2023-12-09") == "2023-12-09"
+    assert dobishem.dates.normalize_date("2023/12/09") == "2023-12-09"
+    assert dobishem.dates.normalize_date("09/12/2023") == "2023-12-09"
+    assert dobishem.dates.normalize_date("dje") == "dje"
+
+def test_batch_dates(tmp_path):
+    strings = ["2023-12-09", "2023/12/09", "09/12/2023"] * 3
+    assert dobishem.dates.normalize_dates(strings) == ["2023-12-09"] * 9
+    assert dobishem.dates.as_dates(strings) == [datetime.date(2023, 12, 9)] * 9
+    assert dobishem.dates.as_datetimes(strings[:1]) == [datetime.datetime(2023, 12, 9)]
+    filename = os.path.join(tmp_path, "slashed.csv")
+    dobishem.storage.save(filename, [{'Date': "09/12/2023", 'Item': "buke"}])
+    assert (dobishem.storage.read_csv(filename,
+                                      transform_row=dobishem.dates.normalizing_dates())
+            == [{'Date': "2023-12-09", 'Item': "buke"}])
+    compact_row = dobishem.compact.row_class(('Date', 'Item'))
+    assert (dobishem.dates.normalizing_dates()(compact_row.make(["09/12/2023", "buke"]))
+            == {'Date': "2023-12-09", 'Item': "buke"})
+
+def test_datetime64_without_numpy(monkeypatch):
+    monkeypatch.setattr(dobishem.dates, "numpy", None)
+    with pytest.raises(ImportError):
+        dobishem.dates.as_dates(["2023-12-09"], datetime64=True)
+    with pytest.raises(ImportError):
+        dobishem.dates.as_datetimes(["2023-12-09"], datetime64=True)
+    assert dobishem.dates.as_dates(["2023-12-09"]) == [datetime.date(2023, 12, 9)]
@@ -1,4 +1,9 @@
-from dobishem.nested_messages import BeginAndEndMessages
+import asyncio
+import concurrent.futures
+import json
+import time
+
+from dobishem.nested_messages import BeginAndEndMessages, BufferedOutput, ProfileCollector, in_current_context
 
 def test_nested_messages():
     print()
@@ -11,3 +16,59 @@ def test_nested_messages():
             mid.print("inside mid two")
         with BeginAndEndMessages("middle three") as mid:
             mid.print("inside mid three")
+
+def test_profile_collector():
+    with ProfileCollector(trace_memory=True) as collector:
+        with BeginAndEndMessages("outer", verbose=False) as outer:
+            with BeginAndEndMessages("inner", verbose=False) as inner:
+                inner.set(rows=3)
+                kept = [0] * 10000
+            with BeginAndEndMessages("second", verbose=False):
+                pass
+    tree = json.loads(collector.to_json())
+    assert [child['name'] for child in tree[0]['children']] == ["inner", "second"]
+    assert tree[0]['children'][0]['attributes'] == {'rows': 3}
+    assert tree[0]['children'][0]['memory_delta'] > 0
+    assert tree[0]['duration_ns'] >= tree[0]['children'][0]['duration_ns']
+    events = collector.to_chrome_trace()['traceEvents']
+    assert [event['name'] for event in events] == ["outer", "inner", "second"]
+    assert all(event['ph'] == "X" for event in events)
+
+def test_concurrent_nesting(capsys):
+    def worker(name):
+        with BufferedOutput():
+            with BeginAndEndMessages(name) as outer:
+                time.sleep(0.01)
+                with BeginAndEndMessages(name + " inner") as inner:
+                    inner.print(name + " working")
+                    time.sleep(0.01)
+        return name
+
+    with ProfileCollector() as collector:
+        with BeginAndEndMessages("pipeline", verbose=False):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+                list(executor.map(in_current_context(worker), ["a", "b", "c"]))
+
+            async def task(name):
+                with BeginAndEndMessages(name, verbose=False):
+                    await asyncio.sleep(0.01)
+                    with BeginAndEndMessages(name + " inner", verbose=False):
+                        await asyncio.sleep(0.01)
+
+            async def tasks():
+                await asyncio.gather(task("x"), task("y"))
+
+            asyncio.run(tasks())
+    output = capsys.readouterr().out.splitlines()
+    for name in ["a", "b", "c"]:
+        start = output.index("    Beginning " + name)
+        assert output[start:start + 5] == ["    Beginning " + name,
+                                           "        Beginning " + name + " inner",
+                                           "            " + name + " working",
+                                           "        Finished " + name + " inner",
+                                           "    Finished " + name]
+    tree = collector.as_dicts()
+    assert len(tree) == 1
+    assert sorted(child['name'] for child in tree[0]['children']) == ["a", "b", "c", "x", "y"]
+    assert all([grandchild['name'] for grandchild in child['children']] == [child['name'] + " inner"]
+               for child in tree[0]['children'])
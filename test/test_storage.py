@@ -1,6 +1,12 @@
+import asyncio
 from collections import defaultdict
 from frozendict import frozendict
 import os
+import pytest
+import shutil
+import stat
+import time
+import dobishem.columnar
 import dobishem.storage
 
 REFERENCE = [ {'Date': "2023-12-09", 'Item': "akullore", 'Price': "1.00"},
@@ -69,3 +75,365 @@ def test_template_selection(tmp_path):
     store.save(REFERENCE, region="Tiranë", country="Shqiperi")
     assert dobishem.storage.read_json(
         os.path.join(tmp_path, "Shqiperi", "Tiranë.json")) == REFERENCE
+
+def test_csv_iter(tmp_path):
+    filename = os.path.join(tmp_path, "lazy.csv")
+    dobishem.storage.default_write_csv(filename, REFERENCE)
+    rows = dobishem.storage.read_csv(filename, result_type=iter, transform_row=xrow)
+    assert not isinstance(rows, list)
+    assert list(rows) == [row for row in FILTERED_REFERENCE if row]
+    assert list(dobishem.storage.load(filename, lazy=True)) == REFERENCE
+    assert list(dobishem.storage.iter_csv(os.path.join(tmp_path, "missing.csv"))) == []
+
+def test_stream_csv(tmp_path):
+    filename = os.path.join(tmp_path, "streamed.csv")
+    extra = {'Date': "2023-12-11", 'Item': "kos", 'Price': "0.80", 'Shop': "Conad"}
+    assert dobishem.storage.save(filename,
+                                 (row for row in REFERENCE + [extra])) == 4
+    assert dobishem.storage.load(filename) == [row | {'Shop': ""} for row in REFERENCE] + [extra]
+    assert dobishem.storage.stream_csv(filename,
+                                       (row for row in REFERENCE + [extra]),
+                                       sample_size=2) == 4
+    assert dobishem.storage.read_csv(filename)[-1] == extra
+    dobishem.storage.stream_csv(filename, iter(REFERENCE),
+                                fieldnames=['Item', 'Date', 'Price'])
+    with open(filename) as instream:
+        assert instream.readline().strip() == "Item,Date,Price"
+    assert dobishem.storage.save(filename, (row for row in [])) == 0
+    with open(filename) as instream:
+        assert instream.readline().strip() == "Item,Date,Price"
+
+def test_csv_parallel(tmp_path):
+    filename = os.path.join(tmp_path, "big.csv")
+    rows = [{'Date': "2023-12-%02d" % (i % 28 + 1),
+             'Item': "artikull %d" % i if i % 7 else "artikull\nme \"rresht\" %d" % i,
+             'Price': "%d.%02d" % (i // 100, i % 100)}
+            for i in range(2000)]
+    dobishem.storage.default_write_csv(filename, rows)
+    expected = dobishem.storage.read_csv(filename, transform_row=xrow)
+    for row_type in (dict, tuple):
+        assert (dobishem.storage.read_csv_parallel(filename,
+                                                   row_type=row_type,
+                                                   min_chunk_size=1000,
+                                                   max_workers=3)
+                == dobishem.storage.read_csv(filename, row_type=row_type))
+    assert dobishem.storage.read_csv_parallel(filename,
+                                              transform_row=xrow,
+                                              min_chunk_size=1000,
+                                              max_workers=3) == expected
+    assert (dobishem.storage.read_csv_parallel(filename,
+                                               result_type=set,
+                                               key_column='Date',
+                                               min_chunk_size=1000)
+            == dobishem.storage.read_csv(filename, result_type=set, key_column='Date'))
+    missing = dobishem.storage.read_csv_parallel(os.path.join(tmp_path, "missing.csv"),
+                                                 result_type=dobishem.columnar.ColumnTable)
+    assert isinstance(missing, dobishem.columnar.ColumnTable)
+    assert list(missing.rows()) == []
+
+def test_combined_concurrently(tmp_path):
+    origins = {}
+    for month in range(1, 7):
+        filename = os.path.join(tmp_path, "month-%d.csv" % month)
+        dobishem.storage.default_write_csv(
+            filename,
+            [row | {'Date': "2023-%02d-%s" % (month, row['Date'][-2:])}
+             for row in REFERENCE])
+        origins[filename] = xrow
+    expected = [[xrow(row) for row in dobishem.storage.load(filename) if xrow(row)]
+                for filename in origins]
+    for pool in ("thread", "process"):
+        destination = os.path.join(tmp_path, pool + ".json")
+        assert dobishem.storage.combined(destination,
+                                         list,
+                                         origins,
+                                         max_workers=3,
+                                         pool=pool) == expected
+
+def test_combined_incrementally(tmp_path):
+    filenames = [os.path.join(tmp_path, "month-%d.csv" % month)
+                 for month in range(1, 4)]
+    for filename in filenames:
+        dobishem.storage.default_write_csv(filename, REFERENCE)
+    destination = os.path.join(tmp_path, "all.json")
+    converted = []
+    def converter(row):
+        converted.append(row)
+        return row
+    origins = dict.fromkeys(filenames, converter)
+    assert dobishem.storage.combined(destination, list, origins,
+                                     manifest=True) == [REFERENCE] * 3
+    assert len(converted) == 9
+    os.utime(destination, (0, 0))
+    dobishem.storage.default_write_csv(filenames[1], REFERENCE[:1])
+    assert dobishem.storage.combined(destination, list, origins,
+                                     manifest=True) == [REFERENCE, REFERENCE[:1], REFERENCE]
+    assert len(converted) == 10
+
+def test_parse_cache(tmp_path):
+    cache = dobishem.storage.ParseCache(os.path.join(tmp_path, "cache"), max_bytes=1000)
+    filenames = [os.path.join(tmp_path, "cached-%d.yaml" % i) for i in range(5)]
+    for filename in filenames:
+        dobishem.storage.save(filename, REFERENCE)
+        assert dobishem.storage.load(filename, cache=cache) == REFERENCE
+        assert dobishem.storage.load(filename, cache=cache) == REFERENCE
+    assert sum(entry.stat().st_size
+               for entry in os.scandir(cache.directory)) <= 1000
+    dobishem.storage.save(filenames[-1], REFERENCE[:1])
+    assert dobishem.storage.load(filenames[-1], cache=cache) == REFERENCE[:1]
+    sidecars = dobishem.storage.ParseCache()
+    assert dobishem.storage.load(filenames[0], cache=sidecars) == REFERENCE
+    assert os.path.exists(os.path.join(tmp_path, ".cached-0.yaml.pickle"))
+    shutil.rmtree(cache.directory)
+    with open(cache.directory, "w"):
+        pass
+    assert dobishem.storage.load(filenames[1], cache=cache) == REFERENCE
+
+def test_memory_cache(tmp_path):
+    cache = dobishem.storage.MemoryCache(max_entries=2)
+    store = dobishem.storage.Storage(templates=TEMPLATES,
+                                     defaults=DEFAULTS,
+                                     base=tmp_path,
+                                     cache=cache)
+    for region in ["Tiranë", "Durrës", "Vlorë"]:
+        store.save(REFERENCE, region=region, country="Shqiperi")
+        assert store.load(region=region, country="Shqiperi") == REFERENCE
+    store.load(region="Vlorë", country="Shqiperi").append("changed")
+    assert store.load(region="Vlorë", country="Shqiperi") == REFERENCE
+    assert (cache.hits, cache.misses, len(cache.entries)) == (2, 3, 2)
+    store.save(REFERENCE[:1], region="Vlorë", country="Shqiperi")
+    assert store.load(region="Vlorë", country="Shqiperi") == REFERENCE[:1]
+    frozen = dobishem.storage.MemoryCache(frozen=True)
+    filename = os.path.join(tmp_path, "Shqiperi", "Tiranë.json")
+    first = dobishem.storage.load(filename, cache=frozen)
+    assert first is dobishem.storage.load(filename, cache=frozen)
+    assert first == tuple(frozendict(row) for row in REFERENCE)
+
+def test_storage_index(tmp_path):
+    store = dobishem.storage.Storage(templates={'by_place': "%(country)s/%(region)s.json",
+                                                'by_year': "%(country)s/%(year)04d-%(country)s.csv"},
+                                     defaults=DEFAULTS,
+                                     base=str(tmp_path))
+    assert store.parse("Shqiperi/2025-Shqiperi.csv") == ('by_year', {'country': "Shqiperi",
+                                                                      'year': "2025"})
+    assert store.parse("Shqiperi/2025-Kosova.csv") == None
+    store.save(REFERENCE, region="Tiranë", country="Shqiperi")
+    store.save(REFERENCE, year=2025, country="Shqiperi")
+    store.save(REFERENCE, year=2024, country="Kosova")
+    assert list(store.find(year=2025).values()) == [{'country': "Shqiperi", 'year': "2025"}]
+    assert len(store.find(country="Shqiperi")) == 2
+    store.save(REFERENCE, year=2025, country="Kosova")
+    assert len(store.index().find(year=2025)) == 2
+    os.remove(store.resolve(region="Tiranë", country="Shqiperi"))
+    assert len(store.index().find()) == 3
+    monthly = dobishem.storage.Storage(templates={'by_month': "%(year)d-%(month)02d.json"},
+                                       defaults=DEFAULTS,
+                                       base=os.path.join(str(tmp_path), "monthly"))
+    monthly.save(REFERENCE, year=2025, month=3)
+    assert list(monthly.find(month=3).values()) == [{'year': "2025", 'month': "03"}]
+
+def test_bulk_and_async(tmp_path):
+    store = dobishem.storage.Storage(templates=TEMPLATES,
+                                     defaults=DEFAULTS,
+                                     base=tmp_path)
+    regions = [{'country': "Shqiperi", 'region': region}
+               for region in ["Tiranë", "Durrës", "Vlorë"]]
+    store.save_many([(REFERENCE[:i + 1], params) for i, params in enumerate(regions)])
+    loaded = store.load_many(regions)
+    assert [len(loaded[frozendict(params)]) for params in regions] == [1, 2, 3]
+    filenames = [store.resolve(**params) for params in regions]
+    assert list(dobishem.storage.load_many(filenames).values()) == list(loaded.values())
+
+    async def roundtrip():
+        await store.asave(REFERENCE, country="Kosova", region="Prishtinë")
+        return await asyncio.gather(store.aload(country="Kosova", region="Prishtinë"),
+                                    dobishem.storage.aload(filenames[0]))
+
+    assert asyncio.run(roundtrip()) == [REFERENCE, REFERENCE[:1]]
+
+def test_write_behind(tmp_path):
+    filename = os.path.join(tmp_path, "later", "state.csv")
+    with dobishem.storage.WriteBehind() as saver:
+        store = dobishem.storage.Storage(templates=TEMPLATES,
+                                         defaults=DEFAULTS,
+                                         base=tmp_path,
+                                         saver=saver)
+        for i in range(len(REFERENCE)):
+            saver.save(filename, REFERENCE[:i + 1])
+            store.save(REFERENCE[:i + 1], country="Shqiperi", region="Tiranë")
+        assert not os.path.exists(filename)
+    assert dobishem.storage.load(filename) == REFERENCE
+    assert store.load(country="Shqiperi", region="Tiranë") == REFERENCE
+    assert os.listdir(os.path.dirname(filename)) == ["state.csv"]
+    saver = dobishem.storage.WriteBehind(max_saves=1)
+    saver.save(filename, REFERENCE[:1])
+    saver.save(filename, REFERENCE[:2])
+    assert dobishem.storage.load(filename) == REFERENCE[:2]
+
+def test_write_behind_errors(tmp_path, capsys):
+    blocked = os.path.join(tmp_path, "not-a-directory")
+    dobishem.storage.save(blocked + ".csv", REFERENCE)
+    os.rename(blocked + ".csv", blocked)
+    unwritable = os.path.join(blocked, "state.csv")
+    filename = os.path.join(tmp_path, "state.csv")
+    saver = dobishem.storage.WriteBehind(interval=0.01)
+    saver.save(unwritable, REFERENCE)
+    saver.save(filename, REFERENCE[:1])
+    for _ in range(200):
+        if os.path.exists(filename):
+            break
+        time.sleep(0.01)
+    saver.save(filename, REFERENCE)
+    for _ in range(200):
+        if dobishem.storage.load(filename) == REFERENCE:
+            break
+        time.sleep(0.01)
+    assert dobishem.storage.load(filename) == REFERENCE
+    assert saver.buffered(unwritable) == (True, REFERENCE)
+    with pytest.raises(OSError):
+        saver.close()
+    assert "Could not write" in capsys.readouterr().out
+
+def test_file_protection(tmp_path):
+    filenames = [os.path.join(tmp_path, name) for name in ("guarded.csv", "also.csv")]
+    for filename in filenames:
+        dobishem.storage.save(filename, REFERENCE * 10)
+    os.chmod(filenames[0], 0o644)
+    with dobishem.storage.FileProtection(filenames[0]):
+        dobishem.storage.save(filenames[0], REFERENCE[:1])
+    assert len(dobishem.storage.load(filenames[0])) == 30
+    assert stat.S_IMODE(os.stat(filenames[0]).st_mode) == 0o644
+    with dobishem.storage.FileProtection(filenames[0], max_reduction=0.5, check_rows=True):
+        dobishem.storage.save(filenames[0], [row | {'Details': "x" * 100} for row in REFERENCE])
+    assert len(dobishem.storage.load(filenames[0])) == 30
+    with dobishem.storage.FilesProtection(filenames):
+        dobishem.storage.save(filenames[0], REFERENCE * 20)
+        dobishem.storage.save(filenames[1], REFERENCE[:1])
+    assert [len(dobishem.storage.load(filename)) for filename in filenames] == [30, 30]
+    assert sorted(os.listdir(tmp_path)) == ["also.csv", "guarded.csv"]
+
+def test_stat_cache(tmp_path):
+    filenames = [os.path.join(tmp_path, "stat-%d.json" % i) for i in range(10)]
+    for i, filename in enumerate(filenames):
+        dobishem.storage.save(filename, REFERENCE)
+        os.utime(filename, (1000 - i, 1000 - i))
+    missing = os.path.join(tmp_path, "missing.json")
+    assert dobishem.storage.in_modification_order(filenames) == filenames[::-1]
+    assert (dobishem.storage.in_modification_order(name for name in filenames)
+            == filenames[::-1])
+    assert dobishem.storage.modified(missing) == 0
+    cache = dobishem.storage.stat_cache
+    with cache.run():
+        assert dobishem.storage.most_recently_modified(filenames + [missing]) == filenames[0]
+        os.utime(filenames[1], (2000, 2000))
+        assert dobishem.storage.modified(filenames[1]) == 999
+        dobishem.storage.save(filenames[2], REFERENCE)
+        assert dobishem.storage.modified(filenames[2]) > 2000
+    assert dobishem.storage.modified(filenames[1]) == 2000
+    assert not cache.entries
+    dangling = os.path.join(tmp_path, "dangling.json")
+    os.symlink(os.path.join(tmp_path, "nowhere.json"), dangling)
+    assert (dobishem.storage.in_modification_order(filenames[3:] + [dangling])
+            == [dangling] + filenames[:2:-1])
+
+def test_compressed(tmp_path):
+    for compression in dobishem.storage.COMPRESSIONS:
+        for extension in ["csv", "json", "yaml", "table"]:
+            filename = os.path.join(tmp_path, "foo." + extension + compression)
+            dobishem.storage.save(filename, REFERENCE)
+            with open(filename, 'rb') as raw:
+                assert b"akullore" not in raw.read()
+            assert dobishem.storage.load(filename) == REFERENCE
+        filename = os.path.join(tmp_path, "foo.csv" + compression)
+        assert dobishem.storage.read_csv_parallel(filename, min_chunk_size=1) == REFERENCE
+    store = dobishem.storage.Storage(templates={'packed': "%(name)s.json.gz"},
+                                     defaults=DEFAULTS,
+                                     base=tmp_path)
+    with store.open_for_write(name="direct") as outstream:
+        outstream.write("[1, 2]")
+    with store.open_for_read(name="direct") as instream:
+        assert instream.read() == "[1, 2]"
+    assert store.load(name="direct") == [1, 2]
+
+def test_jsonl(tmp_path):
+    filename = os.path.join(tmp_path, "events.jsonl")
+    dobishem.storage.save(filename, REFERENCE[:2])
+    dobishem.storage.append_jsonl(filename, REFERENCE[2:])
+    assert dobishem.storage.load(filename) == REFERENCE
+    assert (dobishem.storage.read_jsonl(filename, row_filter=lambda row: row['Date'] == "2023-12-10")
+            == REFERENCE[2:])
+    assert list(dobishem.storage.load(filename, lazy=True)) == REFERENCE
+
+def test_combined_appending(tmp_path):
+    origin = os.path.join(tmp_path, "events.jsonl")
+    destination = os.path.join(tmp_path, "all.jsonl")
+    seen = []
+    def combiner(lists):
+        seen.append(lists)
+        return [row for rows in lists for row in rows]
+    dobishem.storage.save(origin, REFERENCE[:1])
+    dobishem.storage.combined(destination, combiner, {origin: dict},
+                              manifest=True, append=True)
+    os.utime(destination, (0, 0))
+    dobishem.storage.append_jsonl(origin, REFERENCE[1:])
+    assert dobishem.storage.combined(destination, combiner, {origin: dict},
+                                     manifest=True, append=True) == REFERENCE[1:]
+    assert seen[-1] == [REFERENCE[1:]]
+    assert dobishem.storage.load(destination) == REFERENCE
+    os.utime(destination, (0, 0))
+    os.remove(destination + ".manifest")
+    dobishem.storage.combined(destination, combiner, {origin: dict},
+                              manifest=True, append=True)
+    assert dobishem.storage.load(destination) == REFERENCE
+    os.utime(destination, (0, 0))
+    dobishem.storage.save(origin, REFERENCE[::-1])
+    dobishem.storage.combined(destination, combiner, {origin: dict},
+                              manifest=True, append=True)
+    assert dobishem.storage.load(destination) == REFERENCE[::-1]
+
+def test_write_behind_storage_consistency(tmp_path):
+    with dobishem.storage.WriteBehind() as saver:
+        store = dobishem.storage.Storage(templates=TEMPLATES,
+                                         defaults=DEFAULTS,
+                                         base=tmp_path,
+                                         saver=saver)
+        place = {'country': "Shqiperi", 'region': "Tiranë"}
+        store.save([1], **place)
+        asyncio.run(store.asave([2], **place))
+        assert store.load(**place) == [2]
+        assert asyncio.run(store.aload(**place)) == [2]
+        store.save_many([([3], place)])
+        assert store.load_many([place]) == {frozendict(place): [3]}
+    assert store.load(**place) == [3]
+
+def test_save_atomically_keeps_mode(tmp_path):
+    filename = os.path.join(tmp_path, "shared.json")
+    dobishem.storage.save_atomically(filename, REFERENCE)
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o666 & ~umask
+    os.chmod(filename, 0o640)
+    with dobishem.storage.WriteBehind() as saver:
+        saver.save(filename, REFERENCE[:1])
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o640
+
+def test_save_atomically_skips_empty_data(tmp_path):
+    filename = os.path.join(tmp_path, "kept.csv")
+    dobishem.storage.save(filename, REFERENCE)
+    assert dobishem.storage.save_atomically(filename, []) == []
+    assert dobishem.storage.load(filename) == REFERENCE
+    assert os.listdir(tmp_path) == ["kept.csv"]
+
+def test_orgtable_from_generator(tmp_path):
+    filename = os.path.join(tmp_path, "generated.table")
+    assert dobishem.storage.save(filename, (row for row in REFERENCE)) == 3
+    assert dobishem.storage.load(filename) == REFERENCE
+
+def test_orgtable_crlf(tmp_path):
+    filename = os.path.join(tmp_path, "windows.table")
+    dobishem.storage.save(filename, REFERENCE)
+    with open(filename, newline="") as instream:
+        text = instream.read()
+    with open(filename, "w", newline="\r\n") as outstream:
+        outstream.write(text)
+    assert dobishem.storage.load(filename) == REFERENCE
@@ -1,4 +1,6 @@
+import io
 import os
+import pytest
 
 import dobishem.tabular_text
 
@@ -53,3 +55,47 @@ def test_write_tabular_dicts(tmp_path):
         print("file")
         print(backstream.read())
     assert back == data
+
+def test_write_tabular_with_widths(tmp_path):
+    data, _ = dobishem.tabular_text.read_tabular_to_dicts(as_generator(SAMPLE_LINES))
+    data = list(data)
+    widths = dobishem.tabular_text.column_widths(data)
+    filename = os.path.join(tmp_path, "streamed.table")
+    with open(filename, 'w') as outstream:
+        dobishem.tabular_text.write_tabular(outstream, as_generator(data), widths=widths)
+    with open(filename) as backstream:
+        back, _ = dobishem.tabular_text.read_tabular_to_dicts(backstream)
+        assert list(back) == data
+    assert (dobishem.tabular_text.dicts_to_tabular_string(data)
+            == open(filename).read())
+    first_column = next(iter(widths))
+    partial = {name: width for name, width in widths.items() if name != first_column}
+    output = io.StringIO()
+    dobishem.tabular_text.write_tabular(output, data, widths=partial)
+    output.seek(0)
+    back, _ = dobishem.tabular_text.read_tabular_to_dicts(output)
+    assert list(back) == data
+    with pytest.raises(ValueError):
+        dobishem.tabular_text.write_tabular(io.StringIO(), as_generator(data), widths=partial)
+
+def test_read_tabular_fast(tmp_path):
+    expected, expected_columns = dobishem.tabular_text.read_tabular_to_dicts(as_generator(SAMPLE_LINES))
+    read_in, columns = dobishem.tabular_text.read_tabular_fast(as_generator(SAMPLE_LINES))
+    assert columns == expected_columns
+    assert list(read_in) == list(expected)
+    filename = os.path.join(tmp_path, "sample.table")
+    with open(filename, 'w') as outstream:
+        outstream.write(SAMPLE)
+    read_in, _ = dobishem.tabular_text.read_tabular_fast(
+        dobishem.tabular_text.mapped_lines(filename),
+        converters={'size': lambda size: float(size[:-2])})
+    assert [row['size'] for row in read_in][:3] == [999.0, 4000.0, 4000.0]
+
+def test_read_tabular_fast_unaligned():
+    lines = ["|---+---+---|",
+             "| A | B | C |",
+             "|---+---+---|",
+             "| aaaaa | b |",
+             "| x | y | z |"]
+    read_in, _ = dobishem.tabular_text.read_tabular_fast(as_generator(lines))
+    assert list(read_in) == [{'A': "aaaaa", 'B': "b"}, {'A': "x", 'B': "y", 'C': "z"}]